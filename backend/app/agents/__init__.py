@@ -1,32 +1,134 @@
 import logging
 import os
-from typing import Any, Dict, Generator, List
-
-from . import gemini_agent, openai_agent
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional
 
 logger = logging.getLogger("wonderful.agent")
 
+# Provider selection is fixed for the lifetime of the process; resolve it once
+# instead of on every chat request.
+_PROVIDER = os.getenv("MODEL_PROVIDER", "openai").lower()
+_MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "10"))
 
-def stream_agent(messages: List[Dict[str, str]]) -> Generator[Dict[str, Any], None, None]:
+# text_delta coalescing: flush when this many chars are buffered or this long after the first of them
+_COALESCE_MAX_CHARS = 256
+_COALESCE_MAX_DELAY = 0.02
+# Provider events read ahead of the coalescer before the provider stream is paused
+_COALESCE_QUEUE_SIZE = 32
+_STREAM_END = object()
+
+# System prompt shared by both providers; loaded once and interned so every agent holds the same object
+_PROMPT_FILE = Path(__file__).resolve().parents[1] / "system_prompt.txt"
+SYSTEM_INSTRUCTIONS = sys.intern(_PROMPT_FILE.read_text(encoding="utf-8").strip())
+
+# Shared names above must be defined before the provider import below, which binds them.
+if _PROVIDER == "gemini":
+    from .gemini_agent import stream as _STREAM_FN
+else:
+    from .openai_agent import stream as _STREAM_FN
+
+logger.info("Configured stream_agent with provider=%s, max_tool_rounds=%d", _PROVIDER, _MAX_TOOL_ROUNDS)
+
+
+def _put_until_stopped(out: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Put ``item`` on the bounded queue, giving up (False) once the consumer has stopped reading."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _pump_events(events: Generator[Dict[str, Any], None, None], out: queue.Queue, stop: threading.Event) -> None:
+    """Step the provider generator on its own thread, so the coalescer can wait on it with a deadline."""
+    end: Any = _STREAM_END
+    try:
+        for ev in events:
+            if not _put_until_stopped(out, ev, stop):
+                return
+    except Exception as e:
+        # Handed to the consumer, which re-raises it on its own thread
+        end = e
+    finally:
+        events.close()
+    _put_until_stopped(out, end, stop)
+
+
+def _coalesce_text_deltas(events: Generator[Dict[str, Any], None, None]) -> Generator[Dict[str, Any], None, None]:
     """
-    Dispatch to the configured provider. Default: OpenAI.
+    Merge consecutive text_delta events into fewer, larger ones.
+
+    Providers emit one event per token (often a few bytes), and each event costs a
+    JSON encode and an SSE frame downstream. Buffered text is flushed once it reaches
+    _COALESCE_MAX_CHARS, at most _COALESCE_MAX_DELAY after its first delta arrived (even
+    if the model pauses, since the provider stream is read on a separate thread and
+    waited on with a deadline), and always before any non-text event so ordering across
+    event types is preserved. Closing this generator stops the reader thread, which then
+    closes the provider stream once its in-flight read returns.
     """
-    # Basic logging configuration (no-op if already configured by app)
-    if not logging.getLogger().handlers:
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
-        )
+    pending: queue.Queue = queue.Queue(maxsize=_COALESCE_QUEUE_SIZE)
+    stop = threading.Event()
+    threading.Thread(
+        target=_pump_events, args=(events, pending, stop), name="wonderful-agent-stream", daemon=True
+    ).start()
+
+    buf: List[str] = []
+    buf_len = 0
+    deadline: Optional[float] = None
+
+    try:
+        while True:
+            try:
+                if deadline is None:
+                    ev = pending.get()
+                else:
+                    ev = pending.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                # The model paused with text buffered: deliver it instead of waiting for the next token
+                yield {"type": "text_delta", "delta": "".join(buf)}
+                buf.clear()
+                buf_len = 0
+                deadline = None
+                continue
+
+            if ev is _STREAM_END:
+                break
+            if isinstance(ev, Exception):
+                raise ev
 
-    provider = os.getenv("MODEL_PROVIDER", "openai").lower()
-    max_tool_rounds = int(os.getenv("MAX_TOOL_ROUNDS", "10"))
+            if ev["type"] == "text_delta":
+                buf.append(ev["delta"])
+                buf_len += len(ev["delta"])
+                if deadline is None:
+                    deadline = time.monotonic() + _COALESCE_MAX_DELAY
+                if buf_len >= _COALESCE_MAX_CHARS or time.monotonic() >= deadline:
+                    yield {"type": "text_delta", "delta": "".join(buf)}
+                    buf.clear()
+                    buf_len = 0
+                    deadline = None
+                continue
 
-    logger.info("Starting stream_agent with provider=%s, max_tool_rounds=%d", provider, max_tool_rounds)
+            if buf:
+                yield {"type": "text_delta", "delta": "".join(buf)}
+                buf.clear()
+                buf_len = 0
+                deadline = None
+            yield ev
 
-    if provider == "gemini":
-        logger.info("Dispatching to Gemini agent")
-        yield from gemini_agent.stream(messages, max_tool_rounds)
-    else:
-        logger.info("Dispatching to OpenAI agent")
-        yield from openai_agent.stream(messages, max_tool_rounds)
+        if buf:
+            yield {"type": "text_delta", "delta": "".join(buf)}
+    finally:
+        stop.set()
 
+
+def stream_agent(messages: List[Dict[str, str]]) -> Generator[Dict[str, Any], None, None]:
+    """
+    Dispatch to the configured provider. Default: OpenAI.
+    """
+    yield from _coalesce_text_deltas(_STREAM_FN(messages, _MAX_TOOL_ROUNDS))
@@ -1,12 +1,13 @@
-import json
 import logging
 import os
-from pathlib import Path
+from functools import lru_cache
 from typing import Any, Dict, Generator, List
 
 import google.generativeai as genai
+import orjson
 
-from ..tools import TOOL_SPECS, run_tool
+from . import SYSTEM_INSTRUCTIONS
+from ..tools import TOOL_SPECS, run_tools_concurrently
 
 logger = logging.getLogger("wonderful.agent.gemini")
 
@@ -45,10 +46,6 @@ def _to_gemini_tools(tool_specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 
 GEMINI_TOOLS = _to_gemini_tools(TOOL_SPECS)
 
-# Load system prompt from file (same as OpenAI agent)
-_PROMPT_FILE = Path(__file__).resolve().parents[1] / "system_prompt.txt"
-SYSTEM_INSTRUCTIONS = _PROMPT_FILE.read_text(encoding="utf-8").strip()
-
 MODEL = genai.GenerativeModel(
     model_name=_MODEL_VERSION,
     tools=GEMINI_TOOLS if GEMINI_TOOLS else None,
@@ -58,6 +55,18 @@ MODEL = genai.GenerativeModel(
 logger.info("Initialized Gemini agent with model=%s", _MODEL_VERSION)
 
 
+@lru_cache(maxsize=2048)
+def _message_content(role: str, text: str) -> Dict[str, Any]:
+    """
+    Build (and memoize) the Gemini content dict for one history message.
+
+    Clients resend the whole conversation on every request, so the same
+    (role, text) pairs recur; cached dicts are shared across requests and must
+    be treated as read-only.
+    """
+    return {"role": role, "parts": [{"text": text}]}
+
+
 def _convert_messages_to_contents(messages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
     """
     Convert our simple chat message format into Gemini `contents`.
@@ -77,16 +86,7 @@ def _convert_messages_to_contents(messages: List[Dict[str, str]]) -> List[Dict[s
             # Fallback: treat everything else as user content
             role = "user"
 
-        contents.append(
-            {
-                "role": role,
-                "parts": [
-                    {
-                        "text": m.get("content", ""),
-                    }
-                ],
-            }
-        )
+        contents.append(_message_content(role, m.get("content", "")))
 
     return contents
 
@@ -117,48 +117,55 @@ def stream(messages: List[Dict[str, str]], max_tool_rounds: int) -> Generator[Di
             pending_calls: List[Dict[str, Any]] = []
             assistant_text = ""
 
+            turn_finished = False
             for chunk in stream_resp:
-                # Stream text deltas
-                text_delta = getattr(chunk, "text", None)
-                if text_delta:
-                    yield {"type": "text_delta", "delta": text_delta}
-                    assistant_text += text_delta
-
-                # Extract any function calls from this chunk
-                candidates = getattr(chunk, "candidates", None) or []
-                for cand in candidates:
-                    content = getattr(cand, "content", None)
-                    if not content:
-                        continue
-
-                    parts = getattr(content, "parts", None) or []
-                    for part in parts:
-                        function_call = getattr(part, "function_call", None)
-                        if not function_call:
-                            continue
-
-                        name = getattr(function_call, "name", None)
+                # Walk the candidate parts directly: proto fields default to empty values, so no
+                # per-field getattr fallbacks are needed (errors fall through to the handler below).
+                # Text is read per part because `chunk.text` raises on function-call-only chunks.
+                for cand in chunk.candidates:
+                    for part in cand.content.parts:
+                        text_delta = part.text
+                        if text_delta:
+                            yield {"type": "text_delta", "delta": text_delta}
+                            assistant_text += text_delta
+
+                        function_call = part.function_call
+                        name = function_call.name
                         if not name:
                             continue
 
-                        # `args` is a Mapping[str, Any]; convert to plain dict
-                        args: Dict[str, Any]
-                        try:
-                            raw_args = getattr(function_call, "args", None)
-                            args = dict(raw_args) if raw_args is not None else {}
-                        except Exception:
-                            args = {}
-
                         call_id = f"gemini-{name}-{len(pending_calls)}-{round_idx}"
-                        pending_calls.append({"id": call_id, "name": name, "args": args})
+                        # `args` is a Mapping[str, Any]; convert to plain dict. A payload that can't be
+                        # converted fails only this call, reported as its result instead of running it.
+                        error = None
+                        try:
+                            args: Dict[str, Any] = dict(function_call.args)
+                            args_json = orjson.dumps(args, option=orjson.OPT_NON_STR_KEYS).decode()
+                        except Exception as e:
+                            logger.warning("Unreadable arguments for Gemini function call %s: %s", name, e)
+                            args, args_json = {}, "{}"
+                            error = {
+                                "error": "INVALID_ARGUMENTS",
+                                "message": f"Could not read the arguments for {name}: {e}",
+                                "tool": name,
+                            }
+                        pending_calls.append({"id": call_id, "name": name, "args": args, "error": error})
 
                         # For UI parity, emit a single tool_args_delta with the full argument JSON
                         yield {
                             "type": "tool_args_delta",
                             "item_id": call_id,
-                            "delta": json.dumps(args, ensure_ascii=False),
+                            "delta": args_json,
                         }
 
+                    # Once the candidate reports a finish reason, the calls are complete; stop
+                    # reading the stream rather than waiting on trailing chunks
+                    if pending_calls and cand.finish_reason:
+                        turn_finished = True
+
+                if turn_finished:
+                    break
+
             # If we saw any function calls, execute them and continue another round
             if pending_calls:
                 # Add the assistant text (if any) to the chat history
@@ -171,25 +178,34 @@ def stream(messages: List[Dict[str, str]], max_tool_rounds: int) -> Generator[Di
                     )
 
                 for call in pending_calls:
-                    name = call["name"]
-                    call_id = call["id"]
-                    args = call["args"] or {}
-
                     # Emit tool_call event
-                    yield {"type": "tool_call", "name": name, "call_id": call_id, "arguments": args}
+                    yield {"type": "tool_call", "name": call["name"], "call_id": call["id"], "arguments": call["args"] or {}}
 
-                    # Execute the tool locally
-                    result = run_tool(name, args)
-                    yield {"type": "tool_result", "name": name, "call_id": call_id, "result": result}
-
-                    # Add tool result to the chat as a functionResponse
+                # Calls whose arguments couldn't be read already have their (error) result
+                results: List[Any] = [call["error"] for call in pending_calls]
+                for call in pending_calls:
+                    if call["error"] is not None:
+                        yield {"type": "tool_result", "name": call["name"], "call_id": call["id"], "result": call["error"]}
+
+                # Execute the other tools locally and concurrently, streaming each result as it completes
+                runnable = [idx for idx, call in enumerate(pending_calls) if call["error"] is None]
+                for run_idx, result in run_tools_concurrently(
+                    [(pending_calls[idx]["name"], pending_calls[idx]["args"] or {}) for idx in runnable]
+                ):
+                    idx = runnable[run_idx]
+                    call = pending_calls[idx]
+                    results[idx] = result
+                    yield {"type": "tool_result", "name": call["name"], "call_id": call["id"], "result": result}
+
+                # Add tool results to the chat as functionResponses, in the original call order
+                for call, result in zip(pending_calls, results):
                     chat_contents.append(
                         {
                             "role": "tool",
                             "parts": [
                                 {
                                     "function_response": {
-                                        "name": name,
+                                        "name": call["name"],
                                         "response": result,
                                     }
                                 }
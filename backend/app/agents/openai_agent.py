@@ -1,11 +1,12 @@
-import json
 import logging
 import os
-from pathlib import Path
 from typing import Any, Dict, Generator, List
 
+import httpx
+import orjson
 from openai import OpenAI
-from ..tools import TOOL_SPECS, run_tool
+from . import SYSTEM_INSTRUCTIONS
+from ..tools import TOOL_SPECS, run_tools_concurrently
 
 logger = logging.getLogger("wonderful.agent.openai")
 
@@ -17,14 +18,17 @@ if not _API_KEY:
     raise RuntimeError("MODEL_API_KEY (or OPENAI_API_KEY) is required when MODEL_PROVIDER=openai")
 
 MODEL = _MODEL_VERSION
-client = OpenAI(api_key=_API_KEY)
+# One process-wide HTTP/2 connection pool; concurrent chat streams multiplex over kept-alive
+# connections instead of paying a TCP+TLS handshake each.
+_HTTP_CLIENT = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    timeout=httpx.Timeout(60.0, connect=5.0),
+)
+client = OpenAI(api_key=_API_KEY, http_client=_HTTP_CLIENT)
 
 logger.info("Initialized OpenAI agent with model=%s", MODEL)
 
-# Load system prompt from file
-_PROMPT_FILE = Path(__file__).resolve().parents[1] / "system_prompt.txt"
-SYSTEM_INSTRUCTIONS = _PROMPT_FILE.read_text(encoding="utf-8").strip()
-
 
 def _to_openai_tools(tool_specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Convert TOOL_SPECS into OpenAI's expected tool format."""
@@ -48,85 +52,122 @@ def _to_openai_tools(tool_specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return openai_tools
 
 
-OPENAI_TOOLS = _to_openai_tools(TOOL_SPECS)
+# Converted once and frozen; the same object is handed to every request
+OPENAI_TOOLS = tuple(_to_openai_tools(TOOL_SPECS))
+_TOOL_KWARGS: Dict[str, Any] = {"tools": OPENAI_TOOLS, "tool_choice": "auto"} if OPENAI_TOOLS else {}
 
 
 def stream(messages: List[Dict[str, str]], max_tool_rounds: int) -> Generator[Dict[str, Any], None, None]:
-    chat_messages: List[Dict[str, Any]] = [{"role": m["role"], "content": m["content"]} for m in messages]
+    # System prompt leads the history once; later rounds append to this list in place
+    chat_messages: List[Dict[str, Any]] = [{"role": "system", "content": SYSTEM_INSTRUCTIONS}]
+    chat_messages.extend({"role": m["role"], "content": m["content"]} for m in messages)
 
     for _round_idx in range(max_tool_rounds):
         logger.info("OpenAI round %d/%d - messages=%d", _round_idx + 1, max_tool_rounds, len(chat_messages))
         try:
-            stream_resp = client.chat.completions.create(
+            with client.chat.completions.create(
                 model=MODEL,
-                messages=[{"role": "system", "content": SYSTEM_INSTRUCTIONS}] + chat_messages,
-                tools=OPENAI_TOOLS if OPENAI_TOOLS else None,
-                tool_choice="auto",
+                messages=chat_messages,
                 stream=True,
-            )
-
-            assistant_message = {"role": "assistant", "content": "", "tool_calls": []}
-
-            for chunk in stream_resp:
-                if not chunk.choices:
-                    continue
-
-                delta = chunk.choices[0].delta
-
-                # Handle text content streaming
-                if delta.content:
-                    yield {"type": "text_delta", "delta": delta.content}
-                    assistant_message["content"] += delta.content
-
-                # Handle tool calls
-                if delta.tool_calls:
-                    for tool_call_delta in delta.tool_calls:
-                        if tool_call_delta.index is not None:
+                # Sent every round: the loop only continues after a round that made tool calls,
+                # and the model may need further tools (e.g. search_users -> list_user_prescriptions).
+                **_TOOL_KWARGS,
+            ) as stream_resp:
+                content_parts: List[str] = []
+                # Tool-call accumulator as parallel lists indexed by the delta's tool-call index;
+                # argument fragments are collected and joined once the stream ends.
+                call_ids: List[str] = []
+                call_names: List[str] = []
+                arg_bufs: List[List[str]] = []
+
+                for chunk in stream_resp:
+                    if not chunk.choices:
+                        continue
+
+                    choice = chunk.choices[0]
+                    delta = choice.delta
+
+                    # Handle text content streaming
+                    if delta.content:
+                        yield {"type": "text_delta", "delta": delta.content}
+                        content_parts.append(delta.content)
+
+                    # Handle tool calls
+                    if delta.tool_calls:
+                        for tool_call_delta in delta.tool_calls:
                             idx = tool_call_delta.index
-                            # Ensure we have enough tool calls in the list
-                            while len(assistant_message["tool_calls"]) <= idx:
-                                assistant_message["tool_calls"].append({
-                                    "id": "",
-                                    "type": "function",
-                                    "function": {"name": "", "arguments": ""}
-                                })
+                            if idx is None:
+                                continue
+
+                            # Ensure we have enough tool call slots
+                            while len(call_ids) <= idx:
+                                call_ids.append("")
+                                call_names.append("")
+                                arg_bufs.append([])
 
                             if tool_call_delta.id:
-                                assistant_message["tool_calls"][idx]["id"] = tool_call_delta.id
+                                call_ids[idx] = tool_call_delta.id
 
-                            if tool_call_delta.function:
-                                if tool_call_delta.function.name:
-                                    assistant_message["tool_calls"][idx]["function"]["name"] = tool_call_delta.function.name
+                            function = tool_call_delta.function
+                            if function:
+                                if function.name:
+                                    call_names[idx] = function.name
 
-                                if tool_call_delta.function.arguments:
-                                    assistant_message["tool_calls"][idx]["function"]["arguments"] += tool_call_delta.function.arguments
+                                if function.arguments:
+                                    arg_bufs[idx].append(function.arguments)
                                     # Stream tool argument deltas for UI display
-                                    yield {"type": "tool_args_delta", "item_id": assistant_message["tool_calls"][idx]["id"], "delta": tool_call_delta.function.arguments}
+                                    yield {"type": "tool_args_delta", "item_id": call_ids[idx], "delta": function.arguments}
+
+                    # finish_reason marks the turn complete; stop instead of draining the trailing
+                    # chunks, and let the `with` close the response so the connection is released early
+                    if choice.finish_reason:
+                        break
 
             # Check if there are tool calls to execute
-            if assistant_message.get("tool_calls"):
-                chat_messages.append(assistant_message)
+            if call_ids:
+                tool_calls: List[Dict[str, Any]] = []
+                calls = []
+                for call_id, name, arg_buf in zip(call_ids, call_names, arg_bufs):
+                    args_str = "".join(arg_buf)
+                    tool_calls.append({
+                        "id": call_id,
+                        "type": "function",
+                        "function": {"name": name, "arguments": args_str},
+                    })
 
-                for tool_call in assistant_message["tool_calls"]:
-                    name = tool_call["function"]["name"]
-                    call_id = tool_call["id"]
-                    args_str = tool_call["function"]["arguments"]
+                    # Parameterless calls stream no argument text; skip the parse (and its exception path)
+                    args = {}
+                    if args_str:
+                        try:
+                            parsed = orjson.loads(args_str)
+                        except orjson.JSONDecodeError:
+                            parsed = None
+                        if isinstance(parsed, dict):
+                            args = parsed
 
-                    try:
-                        args = json.loads(args_str)
-                    except json.JSONDecodeError:
-                        args = {}
+                    calls.append((name, call_id, args))
 
-                    yield {"type": "tool_call", "name": name, "call_id": call_id, "arguments": args}
+                chat_messages.append({"role": "assistant", "content": "".join(content_parts), "tool_calls": tool_calls})
 
-                    result = run_tool(name, args)
-                    yield {"type": "tool_result", "name": name, "call_id": call_id, "result": result}
+                for name, call_id, args in calls:
+                    yield {"type": "tool_call", "name": name, "call_id": call_id, "arguments": args}
 
-                    # Add tool result to messages
+                # Run this round's tool calls concurrently, streaming each result as it completes.
+                # Each result is encoded once: the bytes feed the chat history and are embedded in the
+                # tool_result event as a Fragment, so the SSE/WebSocket encoder doesn't re-walk it.
+                encoded_results: List[bytes] = [b""] * len(calls)
+                for idx, result in run_tools_concurrently([(name, args) for name, _, args in calls]):
+                    name, call_id, _ = calls[idx]
+                    encoded = orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS)
+                    encoded_results[idx] = encoded
+                    yield {"type": "tool_result", "name": name, "call_id": call_id, "result": orjson.Fragment(encoded)}
+
+                # Add tool results to messages in the original call order
+                for (_, call_id, _), encoded in zip(calls, encoded_results):
                     chat_messages.append({
                         "role": "tool",
                         "tool_call_id": call_id,
-                        "content": json.dumps(result, ensure_ascii=False)
+                        "content": encoded.decode(),
                     })
             else:
                 # No tool calls, we're done
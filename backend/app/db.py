@@ -1,9 +1,16 @@
+import itertools
 import logging
 import os
-from typing import Any, Dict, List, Optional, Tuple
+import re
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import extensions
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 
 logger = logging.getLogger("wonderful.db")
 
@@ -14,58 +21,244 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "pharmacy")
 POSTGRES_USER = os.getenv("POSTGRES_USER", "pharmacy_user")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "pharmacy_pass")
 
+# Connection pool sizing
+POSTGRES_POOL_MIN = int(os.getenv("POSTGRES_POOL_MIN", "2"))
+POSTGRES_POOL_MAX = int(os.getenv("POSTGRES_POOL_MAX", "16"))
 
-def get_conn():
-    """Get PostgreSQL connection. Surface connection errors to caller."""
-    try:
-        conn = psycopg2.connect(
-            host=POSTGRES_HOST,
-            port=POSTGRES_PORT,
-            database=POSTGRES_DB,
-            user=POSTGRES_USER,
-            password=POSTGRES_PASSWORD,
-            cursor_factory=RealDictCursor,
-        )
-        logger.debug("Opened DB connection to %s:%s/%s", POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB)
-        return conn
-    except Exception as e:
-        logger.exception("Database connection failed")
-        # Present connection errors explicitly
-        raise RuntimeError(f"Database connection failed: {e}")
+# Query parameters: a sequence for %s placeholders or a mapping for %(name)s ones
+Params = Union[Sequence[Any], Mapping[str, Any]]
 
+_POOL: Optional[ThreadedConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+# ThreadedConnectionPool raises when exhausted; make callers wait for a free slot instead.
+_POOL_SLOTS = threading.BoundedSemaphore(POSTGRES_POOL_MAX)
 
-def _row_to_dict(row: Any) -> Dict[str, Any]:
-    """Convert database row to dictionary."""
-    return dict(row) if hasattr(row, "keys") else row
 
+class _Connection(extensions.connection):
+    """psycopg2 connection that remembers which statements are prepared on its server session."""
 
-def query_one(sql: str, params: Tuple[Any, ...] = ()) -> Optional[Dict[str, Any]]:
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # SQL text (with %s placeholders) -> prepared statement name
+        self.prepared: Dict[str, str] = {}
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                try:
+                    _POOL = ThreadedConnectionPool(
+                        minconn=POSTGRES_POOL_MIN,
+                        maxconn=POSTGRES_POOL_MAX,
+                        host=POSTGRES_HOST,
+                        port=POSTGRES_PORT,
+                        database=POSTGRES_DB,
+                        user=POSTGRES_USER,
+                        password=POSTGRES_PASSWORD,
+                        connection_factory=_Connection,
+                    )
+                    logger.info(
+                        "Opened DB connection pool to %s:%s/%s (min=%d, max=%d)",
+                        POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB, POSTGRES_POOL_MIN, POSTGRES_POOL_MAX,
+                    )
+                except Exception as e:
+                    logger.exception("Database connection failed")
+                    # Present connection errors explicitly
+                    raise RuntimeError(f"Database connection failed: {e}")
+    return _POOL
+
+
+def pool_is_open() -> bool:
+    """Whether the connection pool currently exists (unlike get_pool, never opens it)."""
+    return _POOL is not None
+
+
+def close_pool() -> None:
+    """Close all pooled connections (called on application shutdown)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.closeall()
+            _POOL = None
+            logger.info("Closed DB connection pool")
+
+
+@contextmanager
+def get_conn() -> Iterator[Any]:
+    """Check out a pooled PostgreSQL connection. Surface connection errors to caller."""
+    pool = get_pool()
+    with _POOL_SLOTS:
+        try:
+            conn = pool.getconn()
+            # Single-statement helpers don't need an explicit transaction; autocommit
+            # avoids leaving reads idle-in-transaction on pooled connections.
+            if not conn.autocommit:
+                conn.autocommit = True
+        except Exception as e:
+            logger.exception("Database connection failed")
+            raise RuntimeError(f"Database connection failed: {e}")
+
+        try:
+            yield conn
+        finally:
+            discard = bool(conn.closed)
+            if not discard and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+            pool.putconn(conn, close=discard)
+
+
+def _columns(cur: Any) -> List[str]:
+    """Column names of the last executed query, resolved once per result set."""
+    return [d.name for d in cur.description]
+
+
+def _row_to_dict(row: Tuple[Any, ...], cols: List[str]) -> Dict[str, Any]:
+    """Convert a tuple row to a dictionary keyed by column name."""
+    return dict(zip(cols, row))
+
+
+def query_one(sql: str, params: Params = ()) -> Optional[Dict[str, Any]]:
     """Execute query and return first row as dict."""
-    logger.debug("query_one: %s params=%s", sql.strip().splitlines()[0], params)
-    with get_conn() as conn:
-        cur = conn.cursor()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("query_one: %s params=%s", sql.strip().splitlines()[0], params)
+    with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, params)
         row = cur.fetchone()
-        cur.close()
-        return _row_to_dict(row) if row else None
+        return _row_to_dict(row, _columns(cur)) if row else None
 
 
-def query_all(sql: str, params: Tuple[Any, ...] = ()) -> List[Dict[str, Any]]:
+def query_all(sql: str, params: Params = ()) -> List[Dict[str, Any]]:
     """Execute query and return all rows as list of dicts."""
-    logger.debug("query_all: %s params=%s", sql.strip().splitlines()[0], params)
-    with get_conn() as conn:
-        cur = conn.cursor()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("query_all: %s params=%s", sql.strip().splitlines()[0], params)
+    with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, params)
         rows = cur.fetchall()
-        cur.close()
-        return [_row_to_dict(r) for r in rows]
+        cols = _columns(cur)
+        return [dict(zip(cols, r)) for r in rows]
 
 
-def exec_sql(sql: str, params: Tuple[Any, ...] = ()) -> None:
-    """Execute SQL statement (INSERT, UPDATE, DELETE)."""
-    logger.debug("exec_sql: %s params=%s", sql.strip().splitlines()[0], params)
+def query_all_with_settings(sql: str, params: Params, settings: Mapping[str, str]) -> List[Dict[str, Any]]:
+    """
+    Like query_all, but with server settings applied for this query only.
+
+    The settings are set with ``set_config(name, value, true)`` in an explicit transaction that
+    ends when the connection is released, so they never leak to the next user of the connection.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("query_all_with_settings: %s params=%s settings=%s", sql.strip().splitlines()[0], params, settings)
     with get_conn() as conn:
-        cur = conn.cursor()
+        # get_conn rolls the transaction back on release
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            for name, value in settings.items():
+                cur.execute("SELECT set_config(%s, %s, true)", (name, value))
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            cols = _columns(cur)
+            return [dict(zip(cols, r)) for r in rows]
+
+
+def query_iter(sql: str, params: Params = (), itersize: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Execute query through a server-side cursor and yield rows as dicts.
+
+    Rows are fetched ``itersize`` at a time instead of materialized up front. The pooled
+    connection is held until the generator is exhausted or closed, so callers that may
+    stop early should wrap it in ``contextlib.closing``.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("query_iter: %s params=%s", sql.strip().splitlines()[0], params)
+    with get_conn() as conn:
+        # Named cursors only exist inside a transaction; get_conn rolls it back on release
+        conn.autocommit = False
+        with conn.cursor(name="query_iter") as cur:
+            cur.itersize = itersize
+            cur.execute(sql, params)
+            cols = None
+            for row in cur:
+                # description is only populated once the first batch has been fetched
+                if cols is None:
+                    cols = _columns(cur)
+                yield dict(zip(cols, row))
+
+
+_CLIENT_PLACEHOLDER = re.compile(r"%%|%s")
+
+
+@lru_cache(maxsize=None)
+def _server_placeholders(sql: str) -> str:
+    """Rewrite psycopg2's positional %s placeholders as PREPARE's $1..$n (and %% as %)."""
+    counter = itertools.count(1)
+    return _CLIENT_PLACEHOLDER.sub(lambda m: "%" if m.group() == "%%" else f"${next(counter)}", sql)
+
+
+def _execute_prepared(conn: Any, cur: Any, sql: str, params: Sequence[Any]) -> None:
+    """Run ``sql`` as a prepared statement, preparing it on this connection the first time."""
+    name = conn.prepared.get(sql)
+    if name is None:
+        name = f"stmt_{len(conn.prepared)}"
+        cur.execute(f"PREPARE {name} AS {_server_placeholders(sql)}")
+        conn.prepared[sql] = name
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+def query_one_prepared(sql: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+    """
+    Like query_one, but through a server-side prepared statement.
+
+    Each pooled connection PREPAREs a given statement text once and afterwards only EXECUTEs it,
+    skipping the parse/analyze step on repeat calls. ``sql`` must use positional %s placeholders,
+    and should come from a bounded set of texts (one prepared statement is kept per text).
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("query_one_prepared: %s params=%s", sql.strip().splitlines()[0], params)
+    with get_conn() as conn, conn.cursor() as cur:
+        _execute_prepared(conn, cur, sql, params)
+        row = cur.fetchone()
+        return _row_to_dict(row, _columns(cur)) if row else None
+
+
+def query_all_prepared(sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+    """Like query_all, but through a server-side prepared statement (see query_one_prepared)."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("query_all_prepared: %s params=%s", sql.strip().splitlines()[0], params)
+    with get_conn() as conn, conn.cursor() as cur:
+        _execute_prepared(conn, cur, sql, params)
+        rows = cur.fetchall()
+        cols = _columns(cur)
+        return [dict(zip(cols, r)) for r in rows]
+
+
+def exec_sql(sql: str, params: Params = ()) -> None:
+    """Execute SQL statement (INSERT, UPDATE, DELETE)."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("exec_sql: %s params=%s", sql.strip().splitlines()[0], params)
+    with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, params)
         conn.commit()
-        cur.close()
+
+
+def exec_many(sql: str, rows: Sequence[Tuple[Any, ...]], page_size: int = 1000) -> None:
+    """
+    Execute a multi-row statement (``INSERT ... VALUES %s``) in one round-trip per page.
+
+    ``sql`` must contain a single ``%s`` placeholder for the VALUES list; psycopg2's
+    execute_values expands it with up to ``page_size`` rows at a time.
+    """
+    if not rows:
+        return
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("exec_many: %s rows=%d", sql.strip().splitlines()[0], len(rows))
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_values(cur, sql, rows, page_size=page_size)
+        conn.commit()
@@ -1,16 +1,59 @@
-import json
+import asyncio
+import logging
 import os
+import threading
+from contextlib import asynccontextmanager, nullcontext
 from pathlib import Path
 
-from fastapi import FastAPI, Request
+import orjson
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 
+# Basic logging configuration (no-op if already configured, e.g. by uvicorn)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+)
+
 from .agents import stream_agent
-from .tools import get_tool_stats
+from .db import close_pool, get_pool
+from .tools import flush_tool_stats, get_tool_stats
+
+logger = logging.getLogger("wonderful.main")
+
+# Encoded SSE frames buffered ahead of a slow client before the agent is paused
+_SSE_QUEUE_SIZE = 32
+
+# Optional cap on chat turns running at once across both chat endpoints (0 = unlimited), to stay
+# under provider rate limits. A turn holds its slot from its first LLM request until its stream
+# ends, tool rounds and slow clients included. Slots are awaited in the event loop before any
+# threadpool work starts, so queued turns don't tie up the worker threads running the admitted ones.
+_MAX_CONCURRENT_LLM_REQUESTS = int(os.getenv("MAX_CONCURRENT_LLM_REQUESTS", "0"))
+_CHAT_SLOTS = (
+    asyncio.Semaphore(_MAX_CONCURRENT_LLM_REQUESTS)
+    if _MAX_CONCURRENT_LLM_REQUESTS > 0
+    else nullcontext()
+)
+
 
-app = FastAPI(title="Wonderful Pharmacy Agent")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the DB pool so the first chat request doesn't pay the connection setup.
+    # A database that is still starting up is not fatal; the pool retries lazily.
+    try:
+        await run_in_threadpool(get_pool)
+    except RuntimeError:
+        logger.warning("DB pool warm-up failed; connections will be opened on first use")
+    yield
+    # Persist buffered tool counts while the pool is still open
+    await run_in_threadpool(flush_tool_stats)
+    close_pool()
+
+
+app = FastAPI(title="Wonderful Pharmacy Agent", lifespan=lifespan)
 
 # CORS middleware for frontend
 app.add_middleware(
@@ -31,16 +74,114 @@ if SERVE_FRONTEND:
     def index():
         return FileResponse(FRONTEND_DIR / "index.html")
 
+
+async def _sse_frames(messages: list):
+    """
+    Stream agent events as SSE frames, encoding ahead of the network send.
+
+    A producer task steps the blocking agent generator and encodes each event in the
+    threadpool, while this generator hands finished frames to the response. The bounded
+    queue lets encoding overlap socket writes without letting a stalled client buffer
+    an unbounded backlog; once it is full the producer (and the agent) wait.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_SSE_QUEUE_SIZE)
+
+    def encode():
+        events = stream_agent(messages)
+        try:
+            # orjson emits UTF-8 bytes directly, so frames go out without a str round-trip
+            for ev in events:
+                yield b"data: " + orjson.dumps(ev) + b"\n\n"
+        finally:
+            events.close()
+
+    frames = encode()
+    # Cancelling the producer doesn't stop a next() already running in the threadpool; the lock
+    # makes close() wait for it instead of failing with "generator already executing".
+    frames_lock = threading.Lock()
+
+    def next_frame():
+        with frames_lock:
+            return next(frames, None)
+
+    def close_frames():
+        with frames_lock:
+            frames.close()
+
+    async def produce():
+        try:
+            while (frame := await run_in_threadpool(next_frame)) is not None:
+                await queue.put(frame)
+        except Exception:
+            logger.exception("SSE producer failed")
+        await queue.put(None)
+
+    async with _CHAT_SLOTS:
+        producer = asyncio.create_task(produce())
+        try:
+            while (frame := await queue.get()) is not None:
+                yield frame
+        finally:
+            # Client went away (or the stream ended): stop pulling from the agent, then close it so
+            # the upstream LLM stream is released promptly rather than at garbage collection
+            producer.cancel()
+            await run_in_threadpool(close_frames)
+
+
 @app.post("/api/chat/stream")
 async def chat_stream(req: Request):
     payload = await req.json()
     messages = payload.get("messages", [])
 
-    def sse():
-        for ev in stream_agent(messages):
-            yield f"data: {json.dumps(ev, ensure_ascii=False)}\n\n"
+    return StreamingResponse(_sse_frames(messages), media_type="text/event-stream")
 
-    return StreamingResponse(sse(), media_type="text/event-stream")
+
+async def _reject_ws(ws: WebSocket, code: int, message: str) -> None:
+    """Report an unusable first frame as an error event, then close the socket with ``code``."""
+    logger.info("Rejected chat WebSocket payload: %s", message)
+    await ws.send_text(orjson.dumps({"type": "error", "error": {"message": message}}).decode())
+    await ws.close(code=code)
+
+
+@app.websocket("/api/chat/ws")
+async def chat_ws(ws: WebSocket):
+    """
+    WebSocket variant of /api/chat/stream: one JSON text frame per agent event,
+    without SSE or chunked-transfer framing around every token.
+
+    The client sends {"messages": [...]} once after connecting; the server closes
+    the socket when the turn is finished.
+    """
+    await ws.accept()
+    try:
+        message = await ws.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        # A binary frame carries "bytes" instead of "text"
+        text = message.get("text")
+        if text is None:
+            await _reject_ws(ws, 1003, "Expected a JSON text frame")
+            return
+        try:
+            payload = orjson.loads(text)
+        except orjson.JSONDecodeError:
+            await _reject_ws(ws, 1003, "Expected a JSON text frame")
+            return
+        if not isinstance(payload, dict) or not isinstance(payload.get("messages"), list):
+            await _reject_ws(ws, 1008, 'Expected {"messages": [...]}')
+            return
+        async with _CHAT_SLOTS:
+            events = stream_agent(payload["messages"])
+            try:
+                # The agents are blocking generators; step them in the threadpool like the SSE path
+                async for ev in iterate_in_threadpool(events):
+                    await ws.send_text(orjson.dumps(ev).decode())
+            finally:
+                await run_in_threadpool(events.close)
+    except WebSocketDisconnect:
+        logger.info("Chat WebSocket closed by client")
+        return
+    await ws.close()
 
 
 @app.get("/api/tools/stats")
@@ -1,8 +1,21 @@
+import base64
+import copy
+import inspect
+import itertools
 import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing, nullcontext
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
-from .db import query_all, query_one, exec_sql
+import orjson
+from cachetools import TTLCache, cached
+
+from .db import Params, query_all, query_all_prepared, query_all_with_settings, query_iter, query_one, query_one_prepared, exec_many, pool_is_open
 
 logger = logging.getLogger("wonderful.tools")
 
@@ -11,40 +24,131 @@ def _like(q: str) -> str:
     return f"%{q.strip()}%"
 
 
-def _fuzzy_medication_candidates(name: str) -> List[Dict[str, Any]]:
+# The filtering tools build WHERE clauses from constant SQL fragments, so each combination of active
+# filters maps to one fixed statement. The _*_sql builders are memoized on that combination, and
+# store_ids bind as one array parameter so list length doesn't multiply the statement texts.
+# That bounded set of texts is run as server-side prepared statements (db.query_*_prepared).
+
+
+# Read-through caches for catalog lookups that repeat within and across conversations.
+# Entries expire after a few minutes so catalog edits made directly in the DB still show up.
+_CATALOG_CACHE_TTL = 300
+_MEDICATION_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=_CATALOG_CACHE_TTL)
+_STORES_CACHE: TTLCache = TTLCache(maxsize=64, ttl=_CATALOG_CACHE_TTL)
+_MED_NAME_INDEX_CACHE: TTLCache = TTLCache(maxsize=1, ttl=_CATALOG_CACHE_TTL)
+
+
+class _Uncached(Exception):
+    """Raised by a _cached_copy function to return `result` without caching it (e.g. a degraded answer)."""
+
+    def __init__(self, result: Any) -> None:
+        super().__init__()
+        self.result = result
+
+
+def _cached_copy(cache: TTLCache) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Like cachetools.cached, but each caller gets its own deep copy of the cached result."""
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        cached_func = cached(cache, lock=threading.Lock())(func)
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return copy.deepcopy(cached_func(*args, **kwargs))
+            except _Uncached as e:
+                return e.result
+
+        return wrapper
+    return decorator
+
+# run_tool memoizes whole results of these read-only catalog tools, keyed by name and arguments.
+# Stock levels and user data (prescriptions, refills) are never cached: they change outside this
+# process, and a stale refill count or expiry date is worse than a round-trip. Callers get a copy,
+# so a caller adding fields to its result can't change what later hits return.
+_CATALOG_RESULT_TOOLS = frozenset({"list_medications", "query_medications_flexible"})
+_TOOL_RESULT_CACHE: TTLCache = TTLCache(maxsize=2048, ttl=_CATALOG_CACHE_TTL)
+_TOOL_RESULT_CACHE_LOCK = threading.Lock()
+
+
+# List-style tools select exactly the keys of their JSON items (rx_required cast to a boolean in SQL)
+# and return the rows as-is, instead of copying every row into a new dict.
+_RX_REQUIRED = "COALESCE({}rx_required::boolean, false) AS rx_required"
+
+
+# Name match shared by the medication lookups; takes one _like() pattern. search_blob is a generated
+# column joining brand, generic and active ingredients, so one trigram index serves all three.
+_MED_NAME_MATCH = "search_blob ILIKE %s"
+
+# Scalar subquery resolving a name to its med_id, or NULL unless exactly one medication matches
+# (the rule get_medication_by_name uses). _resolve_med_id falls back to it for LIKE wildcards.
+_RESOLVE_MED_ID = f"(SELECT MIN(med_id) FROM medications WHERE {_MED_NAME_MATCH} HAVING COUNT(*) = 1)"
+
+# Pages at least this large are streamed through a server-side cursor. Smaller ones are fetched in a
+# single round-trip, which is cheaper than DECLARE/FETCH for the few dozen rows a chat turn asks for.
+_STREAM_ROWS_THRESHOLD = 500
+
+
+def _page_rows(sql: str, params: Params, limit: int, prepared: bool = False):
+    """Context manager yielding an iterator over the rows of one result page."""
+    if limit >= _STREAM_ROWS_THRESHOLD:
+        return closing(query_iter(sql, params))
+    return nullcontext(query_all_prepared(sql, params) if prepared else query_all(sql, params))
+
+
+def _encode_cursor(key: List[Any]) -> str:
+    """Opaque keyset-pagination cursor: URL-safe base64 of the last row's sort key as JSON."""
+    return base64.urlsafe_b64encode(orjson.dumps(key)).decode("ascii")
+
+
+def _decode_cursor(cursor: str, size: int) -> Optional[List[Any]]:
+    """Decode a cursor from _encode_cursor; None if it is malformed or not a `size`-part key."""
+    try:
+        key = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        return None
+    if not isinstance(key, list) or len(key) != size:
+        return None
+    return key
+
+
+def _fuzzy_medication_candidates(name: str) -> Optional[List[Dict[str, Any]]]:
     """
     Best-effort fuzzy search for medications using PostgreSQL pg_trgm similarity.
 
     This lets the agent recover from minor typos (e.g., "iburprofen" -> "ibuprofen").
-    If the pg_trgm extension or similarity function is unavailable, this quietly
-    falls back to an empty list so we don't break the flow.
+    If the pg_trgm extension or similarity function is unavailable (or the query fails), this
+    returns None instead of raising, so callers can tell a failed lookup from "no candidates".
     """
     try:
         # Attempt fuzzy matching; may fail if pg_trgm extension is missing
         # NOTE: requires: CREATE EXTENSION IF NOT EXISTS pg_trgm;
-        rows = query_all(
+        # Word similarity (`<%`) compares the input with the best-matching part of each column, so a
+        # typo still matches inside multi-word values like "Ibuprofen, Caffeine". The operator form
+        # (not `word_similarity() > x`) lets the planner use the trigram GIN indexes; its cut-off is
+        # pg_trgm.word_similarity_threshold, set for this query only.
+        rows = query_all_with_settings(
             """
             SELECT
                 med_id,
                 brand_name,
                 generic_name,
                 GREATEST(
-                    similarity(LOWER(brand_name), LOWER(%s)),
-                    similarity(LOWER(generic_name), LOWER(%s))
+                    word_similarity(%s, brand_name),
+                    word_similarity(%s, generic_name),
+                    word_similarity(%s, active_ingredients)
                 ) AS score
             FROM medications
-            WHERE
-                similarity(LOWER(brand_name), LOWER(%s)) > 0.3
-                OR similarity(LOWER(generic_name), LOWER(%s)) > 0.3
+            WHERE %s <%% brand_name OR %s <%% generic_name OR %s <%% active_ingredients
             ORDER BY score DESC
             LIMIT 5
             """,
-            (name, name, name, name),
+            (name, name, name, name, name, name),
+            {"pg_trgm.word_similarity_threshold": "0.5"},
         )
-    except Exception as e:
-        # If pg_trgm isn't available or any error occurs, just return no fuzzy candidates.
+    except Exception:
+        # If pg_trgm isn't available or any error occurs, report the lookup as failed.
         logger.exception("Fuzzy medication candidate lookup failed for name=%r", name)
-        return []
+        return None
 
     return [
         {
@@ -57,14 +161,38 @@ def _fuzzy_medication_candidates(name: str) -> List[Dict[str, Any]]:
     ]
 
 
+@cached(_MED_NAME_INDEX_CACHE, lock=threading.Lock())
+def _medication_name_index() -> Tuple[Tuple[str, str], ...]:
+    """(med_id, lowercased search_blob) for the whole catalog, refreshed with the catalog caches."""
+    rows = query_all("SELECT med_id, lower(search_blob) AS blob FROM medications ORDER BY med_id", ())
+    return tuple((r["med_id"], r["blob"] or "") for r in rows)
+
+
+def _resolve_med_id(name: str) -> Optional[str]:
+    """med_id for `name` if it matches exactly one catalog entry, otherwise None."""
+    needle = name.strip()
+    if "%" in needle or "_" in needle or "\\" in needle:
+        # The name carries LIKE wildcards or its escape character; let the database apply the ILIKE semantics
+        row = query_one(f"SELECT {_RESOLVE_MED_ID} AS med_id", (_like(name),))
+        return row["med_id"] if row else None
+
+    # Same substring rule as _MED_NAME_MATCH, answered from memory; two matches prove ambiguity
+    needle = needle.lower()
+    matches = list(itertools.islice((med_id for med_id, blob in _medication_name_index() if needle in blob), 2))
+    return matches[0] if len(matches) == 1 else None
+
+
+@_cached_copy(_MEDICATION_CACHE)
 def get_medication_by_name(name: str) -> Dict[str, Any]:
     """Search medications by brand name, generic name, or active ingredient. Returns English data only."""
     rows = query_all(
-        """
-        SELECT * FROM medications
-        WHERE brand_name ILIKE %s OR generic_name ILIKE %s OR active_ingredients ILIKE %s
+        f"""
+        SELECT med_id, brand_name, generic_name, active_ingredients, form, strength, rx_required,
+               standard_directions, warnings, contraindications
+        FROM medications
+        WHERE {_MED_NAME_MATCH}
         """,
-        (_like(name), _like(name), _like(name))
+        (_like(name),)
     )
 
     if not rows:
@@ -79,16 +207,17 @@ def get_medication_by_name(name: str) -> Dict[str, Any]:
                 "candidates": fuzzy,
             }
 
-        # If no fuzzy hits, surface alternatives sharing the active ingredient substring.
-        cand = query_all(
-            "SELECT brand_name, generic_name FROM medications WHERE active_ingredients LIKE %s",
-            (_like(name),)
-        )
-        return {
+        # An active-ingredient substring match would already have been found by the ILIKE
+        # search above, so there is nothing further to suggest.
+        not_found = {
             "found": False,
-            "candidates": [f"{c['brand_name']} ({c['generic_name']})" for c in cand],
+            "candidates": [],
             "input_name": name,
         }
+        if fuzzy is None:
+            # The fuzzy lookup failed (e.g. a transient DB error); don't cache the miss
+            raise _Uncached(not_found)
+        return not_found
 
     if len(rows) > 1:
         # Multiple matches → ask caller to disambiguate
@@ -130,61 +259,97 @@ def get_medication_by_name(name: str) -> Dict[str, Any]:
         }
     }
 
-def list_medications(search_term: str = None, limit: int = 20) -> Dict[str, Any]:
+def list_medications(search_term: str = None, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
     """
     List medications from the catalog. If search_term is provided, searches across brand name,
     generic name, and active ingredients. Use this to browse available medications or find
     medications when you're not sure of the exact name. More efficient than calling
     get_medication_by_name multiple times.
+
+    Results are paged by keyset: pass the returned `next_cursor` back as `cursor` for the
+    next page, which costs the same however deep the page is (no OFFSET).
     """
+    keyset = None
+    if cursor:
+        keyset = _decode_cursor(cursor, 3)
+        if keyset is None:
+            return {"error": "INVALID_CURSOR", "cursor": cursor}
+
+    if limit <= 0:
+        return {"count": 0, "medications": [], "next_cursor": None}
+
+    # Named parameters: the search pattern is bound once however many times the query uses it.
+    # One extra row is fetched to know whether another page exists.
+    params: Dict[str, Any] = {"limit": limit + 1}
     if search_term:
-        # Search with fuzzy matching support
-        search_pattern = _like(search_term)
-        rows = query_all(
-            """
-            SELECT med_id, brand_name, generic_name, active_ingredients, form, strength, rx_required
-            FROM medications
-            WHERE brand_name ILIKE %s OR generic_name ILIKE %s OR active_ingredients ILIKE %s
-            ORDER BY 
-                CASE 
-                    WHEN brand_name ILIKE %s THEN 1
-                    WHEN generic_name ILIKE %s THEN 2
-                    ELSE 3
-                END,
-                brand_name
-            LIMIT %s
-            """,
-            (search_pattern, search_pattern, search_pattern, search_pattern, search_pattern, limit)
-        )
+        # Search with fuzzy matching support; brand matches rank before generic, then ingredient
+        params["pattern"] = _like(search_term)
+        rank_expr = "CASE WHEN brand_name ILIKE %(pattern)s THEN 1 WHEN generic_name ILIKE %(pattern)s THEN 2 ELSE 3 END"
+        med_where = "WHERE search_blob ILIKE %(pattern)s"
     else:
         # List all medications
-        rows = query_all(
-            """
-            SELECT med_id, brand_name, generic_name, active_ingredients, form, strength, rx_required
+        rank_expr = "1"
+        med_where = ""
+
+    keyset_where = ""
+    if keyset:
+        keyset_where = "WHERE (match_rank, brand_name, med_id) > (%(k_rank)s, %(k_brand)s, %(k_id)s)"
+        params.update(zip(("k_rank", "k_brand", "k_id"), keyset))
+
+    sql = f"""
+        SELECT * FROM (
+            SELECT med_id, brand_name, generic_name, active_ingredients, form, strength,
+                   {_RX_REQUIRED.format("")}, {rank_expr} AS match_rank
             FROM medications
-            ORDER BY brand_name
-            LIMIT %s
-            """,
-            (limit,)
-        )
+            {med_where}
+        ) m
+        {keyset_where}
+        ORDER BY match_rank, brand_name, med_id
+        LIMIT %(limit)s
+        """
+
+    medications = []
+    last_key = None
+    next_cursor = None
+    with _page_rows(sql, params, limit) as rows:
+        for r in rows:
+            if len(medications) == limit:
+                # The extra row only signals that another page exists
+                if last_key is not None:
+                    next_cursor = _encode_cursor(last_key)
+                break
+            last_key = [r.pop("match_rank"), r["brand_name"], r["med_id"]]
+            medications.append(r)
     
     return {
-        "count": len(rows),
-        "medications": [
-            {
-                "med_id": r["med_id"],
-                "brand_name": r["brand_name"],
-                "generic_name": r["generic_name"],
-                "active_ingredients": r["active_ingredients"],
-                "form": r["form"],
-                "strength": r["strength"],
-                "rx_required": bool(r["rx_required"]),
-            }
-            for r in rows
-        ]
+        "count": len(medications),
+        "medications": medications,
+        "next_cursor": next_cursor,
     }
 
 
+@lru_cache(maxsize=None)
+def _search_users_sql(conditions: Tuple[str, ...]) -> str:
+    # One branch per selector instead of OR-ing them, so each branch can use its own index
+    # (primary key or trigram GIN); UNION removes users matched by several selectors.
+    # Each branch keeps only its own first 10, which is enough for the overall first 10.
+    branches = " UNION ".join(
+        f"""(
+            SELECT user_id, full_name, phone, email, preferred_language
+            FROM users
+            WHERE {condition}
+            ORDER BY full_name
+            LIMIT 10
+        )"""
+        for condition in conditions
+    )
+    return f"""
+        {branches}
+        ORDER BY full_name
+        LIMIT 10
+    """
+
+
 def search_users(name: str = None, email: str = None, phone: str = None, user_id: str = None) -> Dict[str, Any]:
     """
     Search for users by name, email, phone, or user_id. At least one parameter must be provided.
@@ -210,31 +375,9 @@ def search_users(name: str = None, email: str = None, phone: str = None, user_id
         # Guard: require at least one selector
         return {"error": "At least one search parameter (name, email, phone, or user_id) must be provided"}
     
-    where_clause = " OR ".join(conditions)
-    rows = query_all(
-        f"""
-        SELECT user_id, full_name, phone, email, preferred_language
-        FROM users
-        WHERE {where_clause}
-        ORDER BY full_name
-        LIMIT 10
-        """,
-        tuple(params)
-    )
+    rows = query_all_prepared(_search_users_sql(tuple(conditions)), tuple(params))
     
-    return {
-        "count": len(rows),
-        "users": [
-            {
-                "user_id": r["user_id"],
-                "full_name": r["full_name"],
-                "phone": r["phone"],
-                "email": r["email"],
-                "preferred_language": r["preferred_language"],
-            }
-            for r in rows
-        ]
-    }
+    return {"count": len(rows), "users": rows}
 
 
 def check_stock_availability(med_id: str, store_id: str) -> Dict[str, Any]:
@@ -260,29 +403,52 @@ def check_stock_availability(med_id: str, store_id: str) -> Dict[str, Any]:
 def list_user_prescriptions(user_id: str) -> Dict[str, Any]:
     """List all prescriptions for a user. Returns English data only."""
     rows = query_all(
-        """
-        SELECT p.*, m.brand_name, m.generic_name, m.rx_required
+        f"""
+        SELECT p.prescription_id, p.med_id,
+               concat(m.brand_name, ' (', m.generic_name, ')') AS med_name,
+               p.directions, p.refills_remaining, p.expires_at::text AS expires_at,
+               {_RX_REQUIRED.format("m.")}
         FROM prescriptions p
         JOIN medications m ON m.med_id = p.med_id
         WHERE p.user_id=%s
         """,
         (user_id,)
     )
-    return {
-        "user_id": user_id,
-        "prescriptions": [
-            {
-                "prescription_id": r["prescription_id"],
-                "med_id": r["med_id"],
-                "med_name": f"{r['brand_name']} ({r['generic_name']})",
-                "directions": r["directions"],
-                "refills_remaining": r["refills_remaining"],
-                "expires_at": r["expires_at"],
-                "rx_required": bool(r["rx_required"]),
-            }
-            for r in rows
-        ]
-    }
+    return {"user_id": user_id, "prescriptions": rows}
+
+
+def get_prescription(prescription_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch one prescription by id (primary-key lookup), or None if it doesn't exist.
+
+    Not registered as an agent tool: it isn't scoped to a user, so the agent goes through
+    list_user_prescriptions instead.
+    """
+    return query_one_prepared(
+        f"""
+        SELECT p.prescription_id, p.user_id, p.med_id,
+               concat(m.brand_name, ' (', m.generic_name, ')') AS med_name,
+               p.directions, p.refills_remaining, p.expires_at::text AS expires_at,
+               {_RX_REQUIRED.format("m.")}
+        FROM prescriptions p
+        JOIN medications m ON m.med_id = p.med_id
+        WHERE p.prescription_id = %s
+        """,
+        (prescription_id,)
+    )
+
+
+@lru_cache(maxsize=None)
+def _medications_flexible_sql(conditions: Tuple[str, ...]) -> str:
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+    return f"""
+        SELECT med_id, brand_name, generic_name, active_ingredients, form, strength, {_RX_REQUIRED.format("")}
+        FROM medications
+        WHERE {where_clause}
+        ORDER BY brand_name
+        LIMIT %s
+    """
+
 
 def query_medications_flexible(
     brand_name: Optional[str] = None,
@@ -320,34 +486,46 @@ def query_medications_flexible(
         conditions.append("rx_required = %s")
         params.append(1 if rx_required else 0)
     
-    where_clause = " AND ".join(conditions) if conditions else "1=1"
-    
-    sql = f"""
-        SELECT med_id, brand_name, generic_name, active_ingredients, form, strength, rx_required
-        FROM medications
-        WHERE {where_clause}
-        ORDER BY brand_name
-        LIMIT %s
-    """
     params.append(limit)
     
-    rows = query_all(sql, tuple(params))
+    rows = query_all_prepared(_medications_flexible_sql(tuple(conditions)), tuple(params))
     
-    return {
-        "count": len(rows),
-        "medications": [
-            {
-                "med_id": r["med_id"],
-                "brand_name": r["brand_name"],
-                "generic_name": r["generic_name"],
-                "active_ingredients": r["active_ingredients"],
-                "form": r["form"],
-                "strength": r["strength"],
-                "rx_required": bool(r["rx_required"]),
-            }
-            for r in rows
-        ]
-    }
+    return {"count": len(rows), "medications": rows}
+
+
+@lru_cache(maxsize=None)
+def _medications_with_stock_sql(med_conditions: Tuple[str, ...], by_store: bool, in_stock_only: bool) -> str:
+    med_where = " AND ".join(med_conditions) if med_conditions else "1=1"
+    store_filter = " AND i.store_id = ANY(%s)" if by_store else ""
+    stock_filter = " AND i.quantity > 0" if in_stock_only else ""
+
+    # One row per medication: stock entries are aggregated into a JSON array in the database
+    return f"""
+        SELECT
+            m.med_id,
+            m.brand_name,
+            m.generic_name,
+            m.active_ingredients,
+            m.form,
+            m.strength,
+            {_RX_REQUIRED.format("m.")},
+            COALESCE(
+                json_agg(
+                    json_build_object(
+                        'store_id', i.store_id,
+                        'quantity', i.quantity,
+                        'status', CASE WHEN i.quantity > 0 THEN 'in_stock' ELSE 'out_of_stock' END
+                    ) ORDER BY i.store_id
+                ) FILTER (WHERE i.store_id IS NOT NULL),
+                '[]'::json
+            ) AS stock
+        FROM medications m
+        LEFT JOIN inventory i ON m.med_id = i.med_id {store_filter}
+        WHERE {med_where} {stock_filter}
+        GROUP BY m.med_id
+        ORDER BY m.brand_name, m.med_id
+        LIMIT %s
+    """
 
 
 def query_medications_with_stock(
@@ -369,10 +547,8 @@ def query_medications_with_stock(
     
     if search_term:
         pattern = _like(search_term)
-        med_conditions.append(
-            "(brand_name ILIKE %s OR generic_name ILIKE %s OR active_ingredients ILIKE %s)"
-        )
-        params.extend([pattern, pattern, pattern])
+        med_conditions.append("m.search_blob ILIKE %s")
+        params.append(pattern)
     
     if active_ingredient:
         med_conditions.append("m.active_ingredients ILIKE %s")
@@ -386,69 +562,50 @@ def query_medications_with_stock(
         med_conditions.append("m.rx_required = %s")
         params.append(1 if rx_required else 0)
     
-    med_where = " AND ".join(med_conditions) if med_conditions else "1=1"
+    # The store filter sits in the JOIN, ahead of the WHERE clause, so its parameter is bound first
+    store_params: List[Any] = [list(store_ids)] if store_ids else []
     
-    # Build stock filtering
-    if store_ids:
-        store_placeholders = ",".join(["%s"] * len(store_ids))
-        store_filter = f" AND i.store_id IN ({store_placeholders})"
-        params.extend(store_ids)
-        if in_stock_only:
-            stock_filter = " AND i.quantity > 0"
-        else:
-            stock_filter = ""
-    else:
-        store_filter = ""
-        stock_filter = ""
+    rows = query_all_prepared(
+        _medications_with_stock_sql(tuple(med_conditions), bool(store_ids), bool(in_stock_only)),
+        tuple(store_params + params + [limit]),
+    )
     
-    sql = f"""
-        SELECT DISTINCT
+    return {"count": len(rows), "medications": rows}
+
+
+@lru_cache(maxsize=None)
+def _stock_by_store_sql(by_store: bool, in_stock_only: bool) -> str:
+    # Aggregate the medication's stock into one row; the LEFT JOIN keeps it when no store matches
+    stock_filter = ""
+    if by_store:
+        stock_filter += " AND i.store_id = ANY(%s)"
+    if in_stock_only:
+        stock_filter += " AND i.quantity > 0"
+
+    return f"""
+        SELECT
             m.med_id,
-            m.brand_name,
-            m.generic_name,
-            m.active_ingredients,
-            m.form,
-            m.strength,
-            m.rx_required,
-            COALESCE(i.store_id, 'N/A') as store_id,
-            COALESCE(i.quantity, 0) as quantity,
-            CASE WHEN i.quantity > 0 THEN 'in_stock' ELSE 'out_of_stock' END as stock_status
+            m.brand_name || ' (' || m.generic_name || ')' AS med_name,
+            COUNT(i.store_id) AS count,
+            COALESCE(
+                json_agg(
+                    json_build_object(
+                        'store_id', i.store_id,
+                        'store_name', s.name,
+                        'city', s.city,
+                        'quantity', i.quantity,
+                        'status', CASE WHEN i.quantity > 0 THEN 'in_stock' ELSE 'out_of_stock' END,
+                        'last_updated', i.last_updated
+                    ) ORDER BY s.city, s.name
+                ) FILTER (WHERE i.store_id IS NOT NULL),
+                '[]'::json
+            ) AS stock
         FROM medications m
-        LEFT JOIN inventory i ON m.med_id = i.med_id {store_filter}
-        WHERE {med_where} {stock_filter}
-        ORDER BY m.brand_name, store_id
-        LIMIT %s
+        LEFT JOIN inventory i ON i.med_id = m.med_id{stock_filter}
+        LEFT JOIN stores s ON i.store_id = s.store_id
+        WHERE m.med_id = %s
+        GROUP BY m.med_id
     """
-    params.append(limit)
-    
-    rows = query_all(sql, tuple(params))
-    
-    # Group by medication and aggregate stock info
-    meds = {}
-    for row in rows:
-        med_id = row["med_id"]
-        if med_id not in meds:
-            meds[med_id] = {
-                "med_id": med_id,
-                "brand_name": row["brand_name"],
-                "generic_name": row["generic_name"],
-                "active_ingredients": row["active_ingredients"],
-                "form": row["form"],
-                "strength": row["strength"],
-                "rx_required": bool(row["rx_required"]),
-                "stock": []
-            }
-        if row["store_id"] != "N/A":
-            meds[med_id]["stock"].append({
-                "store_id": row["store_id"],
-                "quantity": row["quantity"],
-                "status": row["stock_status"]
-            })
-    
-    return {
-        "count": len(meds),
-        "medications": list(meds.values())
-    }
 
 
 def query_stock_multiple_stores(
@@ -461,88 +618,33 @@ def query_stock_multiple_stores(
     Check stock availability for a medication across multiple stores in a single query.
     Can search by med_id or medication name. If store_ids not provided, checks all stores.
     """
-    # If med_name provided, first get med_id
-    if med_name and not med_id:
-        med_result = get_medication_by_name(med_name)
-        if not med_result.get("found"):
+    if not med_id and not med_name:
+        # Ensure at least one identifier is provided
+        return {"error": "MISSING_PARAMETER", "message": "Either med_id or med_name must be provided"}
+
+    if not med_id:
+        med_id = _resolve_med_id(med_name)
+        if med_id is None:
             # Explicitly signal when the provided name cannot be resolved
             return {
                 "error": "MEDICATION_NOT_FOUND",
                 "med_name": med_name,
                 "message": "Medication not found in catalog"
             }
-        med_id = med_result["med"]["med_id"]
-    
-    if not med_id:
-        # Ensure at least one identifier is provided
-        return {"error": "MISSING_PARAMETER", "message": "Either med_id or med_name must be provided"}
-    
-    conditions = ["i.med_id = %s"]
-    params = [med_id]
-    
-    if store_ids:
-        store_placeholders = ",".join(["%s"] * len(store_ids))
-        conditions.append(f"i.store_id IN ({store_placeholders})")
-        params.extend(store_ids)
-    
-    if in_stock_only:
-        conditions.append("i.quantity > 0")
-    
-    where_clause = " AND ".join(conditions)
-    
-    sql = f"""
-        SELECT 
-            i.store_id,
-            s.name as store_name,
-            s.city,
-            i.med_id,
-            m.brand_name,
-            m.generic_name,
-            i.quantity,
-            CASE WHEN i.quantity > 0 THEN 'in_stock' ELSE 'out_of_stock' END as status,
-            i.last_updated
-        FROM inventory i
-        JOIN medications m ON i.med_id = m.med_id
-        LEFT JOIN stores s ON i.store_id = s.store_id
-        WHERE {where_clause}
-        ORDER BY s.city, s.name
-    """
-    
-    rows = query_all(sql, tuple(params))
-    
-    # Get medication name if we have results
-    med_name = None
-    if rows and len(rows) > 0:
-        # Safe to access rows[0] since we checked rows is not empty
-        brand = rows[0].get('brand_name', '')
-        generic = rows[0].get('generic_name', '')
-        if brand and generic:
-            med_name = f"{brand} ({generic})"
-    
-    if not med_name and med_id:
-        # If no stock found but med_id exists, get name from medications table
-        med_row = query_one("SELECT brand_name, generic_name FROM medications WHERE med_id = %s", (med_id,))
-        if med_row:
-            med_name = f"{med_row['brand_name']} ({med_row['generic_name']})"
-    
-    return {
-        "med_id": med_id,
-        "med_name": med_name,
-        "count": len(rows),
-        "stock": [
-            {
-                "store_id": r["store_id"],
-                "store_name": r["store_name"],
-                "city": r["city"],
-                "quantity": r["quantity"],
-                "status": r["status"],
-                "last_updated": r["last_updated"]
-            }
-            for r in rows
-        ]
-    }
 
+    # The store filter sits in the JOIN, ahead of the WHERE clause, so its parameter is bound first
+    params: List[Any] = [list(store_ids)] if store_ids else []
+    params.append(med_id)
+
+    row = query_one_prepared(_stock_by_store_sql(bool(store_ids), bool(in_stock_only)), tuple(params))
 
+    if not row:
+        return {"med_id": med_id, "med_name": None, "count": 0, "stock": []}
+
+    return row
+
+
+@_cached_copy(_STORES_CACHE)
 def list_stores(city: Optional[str] = None) -> Dict[str, Any]:
     """
     List available pharmacy store locations.
@@ -559,17 +661,33 @@ def list_stores(city: Optional[str] = None) -> Dict[str, Any]:
             ()
         )
     
-    return {
-        "count": len(rows),
-        "stores": [
-            {
-                "store_id": r["store_id"],
-                "name": r["name"],
-                "city": r["city"]
-            }
-            for r in rows
-        ]
-    }
+    return {"count": len(rows), "stores": rows}
+
+
+@lru_cache(maxsize=None)
+def _prescriptions_flexible_sql(conditions: Tuple[str, ...]) -> str:
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+    return f"""
+        SELECT 
+            p.prescription_id,
+            p.user_id,
+            p.med_id,
+            concat(m.brand_name, ' (', m.generic_name, ')') AS med_name,
+            p.directions,
+            p.refills_remaining,
+            p.expires_at::text AS expires_at,
+            CASE 
+                WHEN p.expires_at < CURRENT_DATE THEN 'expired'
+                WHEN p.refills_remaining <= 0 THEN 'no_refills'
+                ELSE 'active'
+            END as status,
+            {_RX_REQUIRED.format("m.")}
+        FROM prescriptions p
+        JOIN medications m ON p.med_id = m.med_id
+        WHERE {where_clause}
+        ORDER BY p.expires_at, p.prescription_id
+        LIMIT %s
+    """
 
 
 def query_prescriptions_flexible(
@@ -578,12 +696,32 @@ def query_prescriptions_flexible(
     med_name: Optional[str] = None,
     expiring_soon_days: Optional[int] = None,
     has_refills: Optional[bool] = None,
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Flexible prescription query with multiple optional filters.
     Can search by user, medication, expiration status, and refill availability.
+    Paged by keyset on (expires_at, prescription_id); pass `next_cursor` back as `cursor`.
     """
+    keyset = None
+    if cursor:
+        keyset = _decode_cursor(cursor, 2)
+        if keyset is None:
+            return {"error": "INVALID_CURSOR", "cursor": cursor}
+
+    if limit <= 0:
+        return {"count": 0, "prescriptions": [], "next_cursor": None}
+
+    if med_name and not med_id:
+        med_id = _resolve_med_id(med_name)
+        if med_id is None:
+            return {
+                "error": "MEDICATION_NOT_FOUND",
+                "med_name": med_name,
+                "message": "Medication not found in catalog"
+            }
+
     conditions = []
     params = []
     
@@ -594,127 +732,241 @@ def query_prescriptions_flexible(
     if med_id:
         conditions.append("p.med_id = %s")
         params.append(med_id)
-    elif med_name:
-        # First get med_id from name
-        med_result = get_medication_by_name(med_name)
-        if med_result.get("found"):
-            conditions.append("p.med_id = %s")
-            params.append(med_result["med"]["med_id"])
-        else:
-            return {
-                "error": "MEDICATION_NOT_FOUND",
-                "med_name": med_name,
-                "message": "Medication not found in catalog"
-            }
     
     if expiring_soon_days is not None:
-        # Use MAKE_INTERVAL for proper parameter binding with INTERVAL
-        conditions.append("CAST(p.expires_at AS DATE) <= CURRENT_DATE + MAKE_INTERVAL(days => %s)")
+        # expires_at is a DATE, so this is a plain range on the column (index-usable); date + int is a date
+        conditions.append("p.expires_at BETWEEN CURRENT_DATE AND CURRENT_DATE + %s::int")
         params.append(expiring_soon_days)
-        conditions.append("CAST(p.expires_at AS DATE) >= CURRENT_DATE")
     
     if has_refills is not None:
         if has_refills:
             conditions.append("p.refills_remaining > 0")
         else:
             conditions.append("p.refills_remaining <= 0")
+
+    if keyset:
+        conditions.append("(p.expires_at, p.prescription_id) > (%s::date, %s)")
+        params.extend(keyset)
     
-    where_clause = " AND ".join(conditions) if conditions else "1=1"
-    
-    sql = f"""
-        SELECT 
-            p.prescription_id,
-            p.user_id,
-            p.med_id,
-            m.brand_name,
-            m.generic_name,
-            m.rx_required,
-            p.directions,
-            p.refills_remaining,
-            p.expires_at,
-            CASE 
-                WHEN CAST(p.expires_at AS DATE) < CURRENT_DATE THEN 'expired'
-                WHEN p.refills_remaining <= 0 THEN 'no_refills'
-                ELSE 'active'
-            END as status
-        FROM prescriptions p
-        JOIN medications m ON p.med_id = m.med_id
-        WHERE {where_clause}
-        ORDER BY CAST(p.expires_at AS DATE), p.user_id
-        LIMIT %s
-    """
-    params.append(limit)
+    # Fetch one extra row to know whether another page exists
+    params.append(limit + 1)
     
-    rows = query_all(sql, tuple(params))
+    prescriptions = []
+    next_cursor = None
+    with _page_rows(_prescriptions_flexible_sql(tuple(conditions)), tuple(params), limit, prepared=True) as rows:
+        for r in rows:
+            if len(prescriptions) == limit:
+                # The extra row only signals that another page exists
+                last = prescriptions[-1]
+                next_cursor = _encode_cursor([last["expires_at"], last["prescription_id"]])
+                break
+            prescriptions.append(r)
     
     return {
-        "count": len(rows),
-        "prescriptions": [
-            {
-                "prescription_id": r["prescription_id"],
-                "user_id": r["user_id"],
-                "med_id": r["med_id"],
-                "med_name": f"{r['brand_name']} ({r['generic_name']})",
-                "directions": r["directions"],
-                "refills_remaining": r["refills_remaining"],
-                "expires_at": r["expires_at"],
-                "status": r["status"],
-                "rx_required": bool(r["rx_required"])
-            }
-            for r in rows
-        ]
+        "count": len(prescriptions),
+        "prescriptions": prescriptions,
+        "next_cursor": next_cursor,
     }
 
 
+# Refill rejection reason keyed by (owner_ok, has_refills, not_expired). Ownership is reported
+# before refills, and refills before expiry; the all-true combination is an accepted refill.
+_REFILL_REJECTIONS = {
+    flags: "UNAUTHORIZED" if not flags[0] else "NO_REFILLS" if not flags[1] else "EXPIRED"
+    for flags in itertools.product((False, True), repeat=3)
+    if not all(flags)
+}
+
+
 def request_prescription_refill(user_id: str, prescription_id: str) -> Dict[str, Any]:
-    rx = query_one("SELECT * FROM prescriptions WHERE prescription_id=%s", (prescription_id,))
+    now = datetime.utcnow()
+    today = now.date()
+    # Generate unique refill request ID with timestamp to avoid collisions
+    timestamp = now.strftime('%Y%m%d%H%M%S%f')[:-3]  # Include milliseconds
+    rrid = f"RR-{timestamp}-{prescription_id}"
+
+    # Check, decrement and record the request in one atomic statement. The prescription row is
+    # locked while it is checked, so two concurrent refills can't both spend the last one.
+    # The final SELECT reports the pre-update row so a rejection can be explained.
+    rx = query_one(
+        """
+        WITH rx AS (
+            SELECT prescription_id, user_id, refills_remaining, expires_at < %s AS expired
+            FROM prescriptions
+            WHERE prescription_id = %s
+            FOR UPDATE
+        ),
+        upd AS (
+            UPDATE prescriptions p
+            SET refills_remaining = p.refills_remaining - 1
+            FROM rx
+            WHERE p.prescription_id = rx.prescription_id
+              AND rx.user_id = %s
+              AND rx.refills_remaining > 0
+              AND NOT rx.expired
+            RETURNING p.prescription_id
+        ),
+        ins AS (
+            INSERT INTO refill_requests (refill_request_id, prescription_id, user_id, status, created_at)
+            SELECT %s, prescription_id, %s, 'submitted', %s FROM upd
+            RETURNING refill_request_id
+        )
+        SELECT COALESCE(rx.user_id = %s, false) AS owner_ok,
+               COALESCE(rx.refills_remaining > 0, false) AS has_refills,
+               COALESCE(NOT rx.expired, false) AS not_expired,
+               (SELECT refill_request_id FROM ins) AS refill_request_id
+        FROM rx
+        """,
+        (today, prescription_id, user_id, rrid, user_id, now.isoformat() + "Z", user_id)
+    )
     if not rx:
         return {"accepted": False, "error": "NOT_FOUND"}
 
-    if rx["user_id"] != user_id:
-        return {"accepted": False, "error": "UNAUTHORIZED"}
+    if rx["refill_request_id"]:
+        return {"accepted": True, "refill_request_id": rrid, "status": "submitted", "eta_hours": 4}
 
-    if int(rx["refills_remaining"]) <= 0:
-        return {"accepted": False, "error": "NO_REFILLS"}
+    return {
+        "accepted": False,
+        "error": _REFILL_REJECTIONS[(rx["owner_ok"], rx["has_refills"], rx["not_expired"])],
+    }
 
-    if rx["expires_at"] < datetime.utcnow().date().isoformat():
-        return {"accepted": False, "error": "EXPIRED"}
 
-    # Generate unique refill request ID with timestamp to avoid collisions
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')[:-3]  # Include milliseconds
-    rrid = f"RR-{timestamp}-{prescription_id}"
-    exec_sql(
-        "INSERT INTO refill_requests VALUES (%s,%s,%s,%s,%s)",
-        (rrid, prescription_id, user_id, "submitted", datetime.utcnow().isoformat() + "Z")
-    )
-    exec_sql(
-        "UPDATE prescriptions SET refills_remaining = refills_remaining - 1 WHERE prescription_id=%s",
-        (prescription_id,)
+def request_prescription_refills(user_id: str, prescription_ids: List[str]) -> Dict[str, Any]:
+    """
+    Submit refill requests for several of a user's prescriptions at once.
+
+    Equivalent to calling request_prescription_refill for each id, but every prescription is
+    checked, decremented and recorded by one statement. Results come back in input order.
+    """
+    now = datetime.utcnow()
+    # Duplicates would try to insert the same refill_request_id twice; keep the first occurrence
+    ids = list(dict.fromkeys(prescription_ids))
+    rrid_prefix = f"RR-{now.strftime('%Y%m%d%H%M%S%f')[:-3]}-"
+
+    # Same checks as request_prescription_refill, applied set-wise. Rows are locked in a fixed
+    # order so concurrent batches over overlapping prescriptions can't deadlock.
+    rows = query_all(
+        """
+        WITH rx AS (
+            SELECT prescription_id, user_id, refills_remaining, expires_at < %s AS expired
+            FROM prescriptions
+            WHERE prescription_id = ANY(%s)
+            ORDER BY prescription_id
+            FOR UPDATE
+        ),
+        upd AS (
+            UPDATE prescriptions p
+            SET refills_remaining = p.refills_remaining - 1
+            FROM rx
+            WHERE p.prescription_id = rx.prescription_id
+              AND rx.user_id = %s
+              AND rx.refills_remaining > 0
+              AND NOT rx.expired
+            RETURNING p.prescription_id
+        ),
+        ins AS (
+            INSERT INTO refill_requests (refill_request_id, prescription_id, user_id, status, created_at)
+            SELECT %s || prescription_id, prescription_id, %s, 'submitted', %s FROM upd
+            RETURNING refill_request_id, prescription_id
+        )
+        SELECT rx.prescription_id,
+               COALESCE(rx.user_id = %s, false) AS owner_ok,
+               COALESCE(rx.refills_remaining > 0, false) AS has_refills,
+               COALESCE(NOT rx.expired, false) AS not_expired,
+               ins.refill_request_id
+        FROM rx
+        LEFT JOIN ins ON ins.prescription_id = rx.prescription_id
+        """,
+        (now.date(), ids, user_id, rrid_prefix, user_id, now.isoformat() + "Z", user_id)
     )
-    return {"accepted": True, "refill_request_id": rrid, "status": "submitted", "eta_hours": 4}
+    by_id = {r["prescription_id"]: r for r in rows}
+
+    results = []
+    for prescription_id in ids:
+        rx = by_id.get(prescription_id)
+        if not rx:
+            results.append({"prescription_id": prescription_id, "accepted": False, "error": "NOT_FOUND"})
+        elif rx["refill_request_id"]:
+            results.append({
+                "prescription_id": prescription_id,
+                "accepted": True,
+                "refill_request_id": rx["refill_request_id"],
+                "status": "submitted",
+                "eta_hours": 4,
+            })
+        else:
+            results.append({
+                "prescription_id": prescription_id,
+                "accepted": False,
+                "error": _REFILL_REJECTIONS[(rx["owner_ok"], rx["has_refills"], rx["not_expired"])],
+            })
+
+    return {
+        "count": len(results),
+        "accepted_count": sum(1 for r in results if r["accepted"]),
+        "results": results,
+    }
+
+
+# Tool usage counts are aggregated in memory and written to tool_stats in one batched UPSERT
+# every few seconds, instead of one round-trip per tool call.
+_STATS_FLUSH_INTERVAL = 5.0
+_PENDING_STATS: Counter = Counter()
+_PENDING_STATS_LOCK = threading.Lock()
+_STATS_FLUSHER: Optional[threading.Thread] = None
 
 
 def _increment_tool_stat(tool_name: str) -> None:
     """
-    Increment call counter for a tool in the tool_stats table.
+    Count a call to a tool; the background flusher persists it to tool_stats.
 
     This is best-effort only: failures should not break the main flow.
     """
+    global _STATS_FLUSHER
+    with _PENDING_STATS_LOCK:
+        _PENDING_STATS[tool_name] += 1
+        if _STATS_FLUSHER is None:
+            _STATS_FLUSHER = threading.Thread(target=_stats_flush_loop, name="wonderful-tool-stats", daemon=True)
+            _STATS_FLUSHER.start()
+
+
+def _stats_flush_loop() -> None:
+    while True:
+        time.sleep(_STATS_FLUSH_INTERVAL)
+        flush_tool_stats()
+
+
+def flush_tool_stats() -> None:
+    """
+    Write pending tool call counts to tool_stats in a single statement.
+
+    Skipped while the connection pool is closed (e.g. after shutdown's close_pool), so a late
+    flush keeps its counts instead of reopening a pool nothing would close again.
+    """
+    if not pool_is_open():
+        return
+    with _PENDING_STATS_LOCK:
+        if not _PENDING_STATS:
+            return
+        batch = list(_PENDING_STATS.items())
+        _PENDING_STATS.clear()
+
     try:
-        exec_sql(
+        exec_many(
             """
             INSERT INTO tool_stats (tool_name, call_count)
-            VALUES (%s, 1)
+            VALUES %s
             ON CONFLICT (tool_name)
-            DO UPDATE SET call_count = tool_stats.call_count + 1
+            DO UPDATE SET call_count = tool_stats.call_count + EXCLUDED.call_count
             """,
-            (tool_name,),
+            batch,
         )
-    except Exception as e:
-        # Swallow errors so analytics never impact the user experience,
-        # but do log them for observability.
-        logger.exception("Failed to increment tool_stats for tool=%r", tool_name)
-        return
+    except Exception:
+        # Swallow errors so analytics never impact the user experience, but keep the
+        # counts for the next flush and log for observability.
+        logger.exception("Failed to flush tool_stats for %d tools", len(batch))
+        with _PENDING_STATS_LOCK:
+            _PENDING_STATS.update(dict(batch))
 
 
 def get_tool_stats() -> List[Dict[str, Any]]:
@@ -727,11 +979,12 @@ def get_tool_stats() -> List[Dict[str, Any]]:
         ...
       ]
     """
-    rows = query_all(
-        "SELECT tool_name, call_count FROM tool_stats ORDER BY call_count DESC",
-        (),
-    )
-    return [{"tool_name": r["tool_name"], "call_count": int(r["call_count"])} for r in rows]
+    rows = query_all("SELECT tool_name, call_count FROM tool_stats", ())
+    # Include calls still buffered for the next flush, so the page isn't up to one interval behind
+    with _PENDING_STATS_LOCK:
+        counts = Counter(_PENDING_STATS)
+    counts.update({r["tool_name"]: int(r["call_count"]) for r in rows})
+    return [{"tool_name": name, "call_count": count} for name, count in counts.most_common()]
 
 TOOL_SPECS = [
     {
@@ -754,7 +1007,8 @@ TOOL_SPECS = [
             "type": "object",
             "properties": {
                 "search_term": {"type": "string", "description": "Optional search term to filter medications by brand name, generic name, or active ingredients. If not provided, returns all medications up to the limit."},
-                "limit": {"type": "integer", "description": "Maximum number of medications to return (default: 20, max recommended: 50)"}
+                "limit": {"type": "integer", "description": "Maximum number of medications to return (default: 20, max recommended: 50)"},
+                "cursor": {"type": "string", "description": "Pagination cursor: pass the next_cursor value from a previous response to get the following page. Keep the same search_term."}
             },
             "required": []
         },
@@ -812,6 +1066,19 @@ TOOL_SPECS = [
             "required": ["user_id", "prescription_id"]
         },
     },
+    {
+        "type": "function",
+        "name": "request_prescription_refills",
+        "description": "Submit refill requests for several of a user's prescriptions in one call. Use this instead of calling request_prescription_refill repeatedly. Returns one result per prescription, in the order given.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "user_id": {"type": "string"},
+                "prescription_ids": {"type": "array", "items": {"type": "string"}, "description": "Prescription IDs to refill"},
+            },
+            "required": ["user_id", "prescription_ids"]
+        },
+    },
     {
         "type": "function",
         "name": "query_medications_flexible",
@@ -842,7 +1109,7 @@ TOOL_SPECS = [
                 "form": {"type": "string", "description": "Filter by form (e.g., 'tablet')"},
                 "rx_required": {"type": "boolean", "description": "Filter by prescription requirement"},
                 "store_ids": {"type": "array", "items": {"type": "string"}, "description": "List of store IDs to check (e.g., ['STORE_TLV_01', 'STORE_JLM_01']). If not provided, checks all stores."},
-                "in_stock_only": {"type": "boolean", "description": "If true, only return medications that are in stock at the specified stores"},
+                "in_stock_only": {"type": "boolean", "description": "If true, only return medications that are in stock at the specified stores (or at any store if store_ids is not provided)"},
                 "limit": {"type": "integer", "description": "Maximum number of medications to return (default: 20)"}
             },
             "required": []
@@ -887,52 +1154,118 @@ TOOL_SPECS = [
                 "med_name": {"type": "string", "description": "Filter by medication name (will look up med_id)"},
                 "expiring_soon_days": {"type": "integer", "description": "Find prescriptions expiring within this many days (e.g., 7 for next week)"},
                 "has_refills": {"type": "boolean", "description": "Filter by refill availability (true = has refills remaining, false = no refills)"},
-                "limit": {"type": "integer", "description": "Maximum number of results (default: 50)"}
+                "limit": {"type": "integer", "description": "Maximum number of results (default: 50)"},
+                "cursor": {"type": "string", "description": "Pagination cursor: pass the next_cursor value from a previous response to get the following page. Keep the same filters."}
             },
             "required": []
         },
     },
 ]
 
-def run_tool(name: str, args: Dict[str, Any]) -> Dict[str, Any]:
-    # Map tool name to implementation
-    tool_map = {
-        "get_medication_by_name": get_medication_by_name,
-        "list_medications": list_medications,
-        "search_users": search_users,
-        "check_stock_availability": check_stock_availability,
-        "list_user_prescriptions": list_user_prescriptions,
-        "request_prescription_refill": request_prescription_refill,
-        "query_medications_flexible": query_medications_flexible,
-        "query_medications_with_stock": query_medications_with_stock,
-        "query_stock_multiple_stores": query_stock_multiple_stores,
-        "list_stores": list_stores,
-        "query_prescriptions_flexible": query_prescriptions_flexible,
-    }
+# Tool name -> implementation, built once at import
+_TOOL_MAP: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "get_medication_by_name": get_medication_by_name,
+    "list_medications": list_medications,
+    "search_users": search_users,
+    "check_stock_availability": check_stock_availability,
+    "list_user_prescriptions": list_user_prescriptions,
+    "request_prescription_refill": request_prescription_refill,
+    "request_prescription_refills": request_prescription_refills,
+    "query_medications_flexible": query_medications_flexible,
+    "query_medications_with_stock": query_medications_with_stock,
+    "query_stock_multiple_stores": query_stock_multiple_stores,
+    "list_stores": list_stores,
+    "query_prescriptions_flexible": query_prescriptions_flexible,
+}
+
+# Each tool's parameters as (name, default) pairs in signature order, resolved once so run_tool
+# can call it positionally instead of unpacking the model's arguments as **kwargs
+_NO_DEFAULT = inspect.Parameter.empty
+_TOOL_ADAPTERS: Dict[str, Tuple[Callable[..., Dict[str, Any]], Tuple[Tuple[str, Any], ...]]] = {
+    name: (func, tuple((p.name, p.default) for p in inspect.signature(func).parameters.values()))
+    for name, func in _TOOL_MAP.items()
+}
+# Parameters without a default, checked against the model's arguments before dispatch
+_REQUIRED: Dict[str, frozenset] = {
+    name: frozenset(p for p, default in params if default is _NO_DEFAULT)
+    for name, (_func, params) in _TOOL_ADAPTERS.items()
+}
+# All parameter names, so arguments a tool doesn't declare are reported instead of silently dropped
+_PARAM_NAMES: Dict[str, frozenset] = {
+    name: frozenset(p for p, _default in params)
+    for name, (_func, params) in _TOOL_ADAPTERS.items()
+}
+
 
-    func = tool_map.get(name)
-    if not func:
+def run_tool(name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    adapter = _TOOL_ADAPTERS.get(name)
+    if not adapter:
         return {"error": "UNKNOWN_TOOL", "tool": name}
+    func, params = adapter
 
     # Best-effort tracking of tool usage; never let analytics break the main flow
     try:
         _increment_tool_stat(name)
-    except Exception as e:
+    except Exception:
         # Should be unreachable because _increment_tool_stat already swallows,
         # but double-guard + logging to keep tool execution safe and observable.
         logger.exception("Unexpected error while incrementing tool_stats for tool=%r", name)
 
-    # Execute the tool function with error handling
-    try:
-        return func(**args)
-    except TypeError as e:
+    cacheable = name in _CATALOG_RESULT_TOOLS
+    if cacheable:
+        key = (name, orjson.dumps(args, option=orjson.OPT_SORT_KEYS))
+        with _TOOL_RESULT_CACHE_LOCK:
+            cached_result = _TOOL_RESULT_CACHE.get(key)
+        if cached_result is not None:
+            return copy.deepcopy(cached_result)
+
+    missing = _REQUIRED[name] - args.keys()
+    if missing:
         # Handle missing required arguments
-        error_msg = str(e)
-        if "missing" in error_msg and "required" in error_msg:
-            return {
-                "error": "MISSING_REQUIRED_ARGUMENT",
-                "message": error_msg,
-                "tool": name
-            }
-        # Re-raise other TypeErrors
-        raise
+        missing_names = sorted(missing)
+        return {
+            "error": "MISSING_REQUIRED_ARGUMENT",
+            "message": f"{func.__name__}() missing required argument(s): {', '.join(missing_names)}",
+            "missing": missing_names,
+            "tool": name
+        }
+
+    unexpected = args.keys() - _PARAM_NAMES[name]
+    if unexpected:
+        # Positional dispatch would otherwise ignore them and run with the defaults
+        unexpected_names = sorted(unexpected)
+        return {
+            "error": "UNEXPECTED_ARGUMENT",
+            "message": f"{func.__name__}() got unexpected argument(s): {', '.join(unexpected_names)}",
+            "unexpected": unexpected_names,
+            "tool": name
+        }
+
+    result = func(*[args.get(p, default) for p, default in params])
+
+    if cacheable:
+        with _TOOL_RESULT_CACHE_LOCK:
+            _TOOL_RESULT_CACHE[key] = copy.deepcopy(result)
+    return result
+
+
+# Shared workers for running the independent tool calls of a single model turn concurrently
+_TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="wonderful-tool")
+
+
+def run_tools_concurrently(calls: List[Tuple[str, Dict[str, Any]]]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Execute independent tool calls concurrently (tools are DB-bound, so threads overlap their I/O).
+
+    Yields (index, result) pairs in completion order so callers can stream each result as soon
+    as it is ready; `index` is the position of the call in `calls`.
+    """
+    if len(calls) == 1:
+        # Nothing to overlap with; skip the thread handoff and future bookkeeping
+        name, args = calls[0]
+        yield 0, run_tool(name, args)
+        return
+
+    futures = {_TOOL_EXECUTOR.submit(run_tool, name, args): idx for idx, (name, args) in enumerate(calls)}
+    for fut in as_completed(futures):
+        yield futures[fut], fut.result()
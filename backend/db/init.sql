@@ -22,7 +22,12 @@ CREATE TABLE IF NOT EXISTS medications (
   rx_required INTEGER,
   standard_directions TEXT,
   warnings TEXT,
-  contraindications TEXT
+  contraindications TEXT,
+  -- Brand, generic and active ingredients in one column so name searches need a single index.
+  -- Newline-separated so a single-line search term can't match across two fields.
+  search_blob TEXT GENERATED ALWAYS AS (
+    coalesce(brand_name, '') || E'\n' || coalesce(generic_name, '') || E'\n' || coalesce(active_ingredients, '')
+  ) STORED
 );
 
 CREATE TABLE IF NOT EXISTS stores (
@@ -45,7 +50,7 @@ CREATE TABLE IF NOT EXISTS prescriptions (
   med_id TEXT,
   directions TEXT,
   refills_remaining INTEGER,
-  expires_at TEXT
+  expires_at DATE
 );
 
 CREATE TABLE IF NOT EXISTS refill_requests (
@@ -61,6 +66,40 @@ CREATE TABLE IF NOT EXISTS tool_stats (
   call_count BIGINT NOT NULL DEFAULT 0
 );
 
+-- Trigram indexes so ILIKE '%term%' searches on medication names are index-backed
+-- (keep queries on the plain columns; wrapping them in LOWER() bypasses these indexes)
+CREATE INDEX IF NOT EXISTS medications_brand_trgm ON medications USING gin (brand_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS medications_generic_trgm ON medications USING gin (generic_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS medications_active_trgm ON medications USING gin (active_ingredients gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS medications_search_blob_trgm ON medications USING gin (search_blob gin_trgm_ops);
+
+-- Trigram indexes for partial matches in search_users
+CREATE INDEX IF NOT EXISTS users_name_trgm ON users USING gin (full_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_email_trgm ON users USING gin (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_phone_trgm ON users USING gin (phone gin_trgm_ops);
+
+-- Foreign-key style lookups. inventory's (store_id, med_id) primary key already serves store_id
+-- filters and prescriptions_user_med_expires_idx serves user_id, so only the med_id-led paths are added.
+CREATE INDEX IF NOT EXISTS prescriptions_med_idx ON prescriptions (med_id);
+CREATE INDEX IF NOT EXISTS prescriptions_expires_idx ON prescriptions (expires_at);
+CREATE UNIQUE INDEX IF NOT EXISTS inventory_med_store_idx ON inventory (med_id, store_id);
+
+-- in_stock_only lookups only ever touch rows with stock; the partial index skips the rest
+CREATE INDEX IF NOT EXISTS inventory_in_stock_idx ON inventory (med_id, store_id)
+  INCLUDE (quantity) WHERE quantity > 0;
+
+-- The one user_id-led prescription index. Its keys serve multi-filter queries (user + medication) in
+-- query_prescriptions_flexible's (expires_at, prescription_id) keyset order, so a page is read straight
+-- off the index; the INCLUDE columns make per-user listings an index-only scan on the prescriptions side.
+CREATE INDEX IF NOT EXISTS prescriptions_user_med_expires_idx
+  ON prescriptions (user_id, med_id, expires_at, prescription_id)
+  INCLUDE (directions, refills_remaining);
+
+-- has_refills=false pages: the partial predicate matches the tool's literal `refills_remaining <= 0`
+-- condition and the keys its keyset order, so LIMIT stops after the first few index entries
+CREATE INDEX IF NOT EXISTS prescriptions_no_refills_idx
+  ON prescriptions (expires_at, prescription_id) WHERE refills_remaining <= 0;
+
 -- Seed data: 10 users
 INSERT INTO users (user_id, full_name, phone, email, preferred_language) VALUES
 ('1001', 'User 1001', '+972-50-00001001', 'user1001@example.com', 'en'),
@@ -230,33 +269,38 @@ ON CONFLICT (store_id, med_id) DO NOTHING;
 -- Seed data: Prescriptions - various scenarios
 INSERT INTO prescriptions (prescription_id, user_id, med_id, directions, refills_remaining, expires_at) VALUES
 -- Active prescriptions with refills
-('RX-0001', '1003', 'MED004', 'Take 1 tablet once daily as prescribed.', 2, (CURRENT_DATE + INTERVAL '30 days')::TEXT),
-('RX-0002', '1005', 'MED010', 'Take 1 tablet once daily in the morning.', 5, (CURRENT_DATE + INTERVAL '90 days')::TEXT),
-('RX-0003', '1007', 'MED012', 'Take 1 tablet twice daily with meals.', 3, (CURRENT_DATE + INTERVAL '60 days')::TEXT),
-('RX-0004', '1009', 'MED005', 'Take 1 tablet once daily at bedtime.', 1, (CURRENT_DATE + INTERVAL '15 days')::TEXT),
-('RX-0005', '1011', 'MED011', 'Take 1 tablet once daily as prescribed.', 4, (CURRENT_DATE + INTERVAL '45 days')::TEXT),
+('RX-0001', '1003', 'MED004', 'Take 1 tablet once daily as prescribed.', 2, CURRENT_DATE + 30),
+('RX-0002', '1005', 'MED010', 'Take 1 tablet once daily in the morning.', 5, CURRENT_DATE + 90),
+('RX-0003', '1007', 'MED012', 'Take 1 tablet twice daily with meals.', 3, CURRENT_DATE + 60),
+('RX-0004', '1009', 'MED005', 'Take 1 tablet once daily at bedtime.', 1, CURRENT_DATE + 15),
+('RX-0005', '1011', 'MED011', 'Take 1 tablet once daily as prescribed.', 4, CURRENT_DATE + 45),
 
 -- Prescriptions with no refills remaining
-('RX-0006', '1003', 'MED006', 'Take 1 tablet twice daily. Complete the full course.', 0, (CURRENT_DATE + INTERVAL '20 days')::TEXT),
-('RX-0007', '1001', 'MED007', 'Take 1 tablet once daily for 5 days.', 0, (CURRENT_DATE + INTERVAL '10 days')::TEXT),
+('RX-0006', '1003', 'MED006', 'Take 1 tablet twice daily. Complete the full course.', 0, CURRENT_DATE + 20),
+('RX-0007', '1001', 'MED007', 'Take 1 tablet once daily for 5 days.', 0, CURRENT_DATE + 10),
 
 -- Prescriptions expiring soon (within 7 days)
-('RX-0008', '1002', 'MED004', 'Take 1 tablet once daily.', 1, (CURRENT_DATE + INTERVAL '5 days')::TEXT),
-('RX-0009', '1004', 'MED010', 'Take 1 tablet once daily.', 2, (CURRENT_DATE + INTERVAL '3 days')::TEXT),
+('RX-0008', '1002', 'MED004', 'Take 1 tablet once daily.', 1, CURRENT_DATE + 5),
+('RX-0009', '1004', 'MED010', 'Take 1 tablet once daily.', 2, CURRENT_DATE + 3),
 
 -- Prescriptions expiring in medium term (8-30 days)
-('RX-0010', '1006', 'MED005', 'Take 1 tablet once daily.', 0, (CURRENT_DATE + INTERVAL '12 days')::TEXT),
-('RX-0011', '1008', 'MED011', 'Take 1 tablet once daily.', 3, (CURRENT_DATE + INTERVAL '25 days')::TEXT),
-('RX-0012', '1010', 'MED012', 'Take 1 tablet twice daily with meals.', 2, (CURRENT_DATE + INTERVAL '18 days')::TEXT),
+('RX-0010', '1006', 'MED005', 'Take 1 tablet once daily.', 0, CURRENT_DATE + 12),
+('RX-0011', '1008', 'MED011', 'Take 1 tablet once daily.', 3, CURRENT_DATE + 25),
+('RX-0012', '1010', 'MED012', 'Take 1 tablet twice daily with meals.', 2, CURRENT_DATE + 18),
 
 -- Multiple prescriptions for same user
-('RX-0013', '1013', 'MED004', 'Take 1 tablet once daily.', 1, (CURRENT_DATE + INTERVAL '40 days')::TEXT),
-('RX-0014', '1013', 'MED010', 'Take 1 tablet once daily in the morning.', 2, (CURRENT_DATE + INTERVAL '35 days')::TEXT),
-('RX-0015', '1013', 'MED011', 'Take 1 tablet once daily.', 0, (CURRENT_DATE + INTERVAL '22 days')::TEXT),
+('RX-0013', '1013', 'MED004', 'Take 1 tablet once daily.', 1, CURRENT_DATE + 40),
+('RX-0014', '1013', 'MED010', 'Take 1 tablet once daily in the morning.', 2, CURRENT_DATE + 35),
+('RX-0015', '1013', 'MED011', 'Take 1 tablet once daily.', 0, CURRENT_DATE + 22),
 
 -- Prescriptions for different medication types
-('RX-0016', '1015', 'MED006', 'Take 1 tablet twice daily with food. Complete full course.', 1, (CURRENT_DATE + INTERVAL '28 days')::TEXT),
-('RX-0017', '1012', 'MED005', 'Take 1 tablet once daily at bedtime.', 4, (CURRENT_DATE + INTERVAL '50 days')::TEXT),
-('RX-0018', '1014', 'MED012', 'Take 1 tablet twice daily with meals.', 2, (CURRENT_DATE + INTERVAL '33 days')::TEXT)
+('RX-0016', '1015', 'MED006', 'Take 1 tablet twice daily with food. Complete full course.', 1, CURRENT_DATE + 28),
+('RX-0017', '1012', 'MED005', 'Take 1 tablet once daily at bedtime.', 4, CURRENT_DATE + 50),
+('RX-0018', '1014', 'MED012', 'Take 1 tablet twice daily with meals.', 2, CURRENT_DATE + 33)
 ON CONFLICT (prescription_id) DO NOTHING;
 
+-- Refresh planner statistics after seeding so the new indexes are considered
+ANALYZE medications;
+ANALYZE prescriptions;
+ANALYZE inventory;
+ANALYZE users;
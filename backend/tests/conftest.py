@@ -1,35 +1,36 @@
 """
 Pytest configuration and fixtures for backend tests.
 """
+import logging
 import pytest
 import os
-import sys
+import threading
 import warnings
-import traceback
+from contextlib import contextmanager
 from pathlib import Path
 
-# Add parent directory to path so we can import app
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-
-# Load .env file if it exists
-try:
-    from dotenv import load_dotenv
-    # Look for .env in project root (2 levels up from tests/)
-    env_path = Path(__file__).parent.parent.parent / '.env'
-    if env_path.exists():
-        load_dotenv(env_path)
-        print(f"✓ Loaded environment variables from {env_path}")
-    else:
-        # Also check in backend directory
-        env_path = Path(__file__).parent.parent / '.env'
+# Load .env file if it exists (skipped when the environment already provides the DB settings, e.g. in CI)
+if os.getenv("CI") != "true" and not os.getenv("POSTGRES_HOST"):
+    try:
+        from dotenv import load_dotenv
+        # Look for .env in project root (2 levels up from tests/)
+        env_path = Path(__file__).parent.parent.parent / '.env'
         if env_path.exists():
             load_dotenv(env_path)
             print(f"✓ Loaded environment variables from {env_path}")
         else:
-            print("⚠ No .env file found, using environment variables and defaults")
-except ImportError:
-    print("⚠ python-dotenv not installed, skipping .env file loading")
-    print("  Install with: pip install python-dotenv")
+            # Also check in backend directory
+            env_path = Path(__file__).parent.parent / '.env'
+            if env_path.exists():
+                load_dotenv(env_path)
+                print(f"✓ Loaded environment variables from {env_path}")
+            else:
+                print("⚠ No .env file found, using environment variables and defaults")
+    except ImportError:
+        print("⚠ python-dotenv not installed, skipping .env file loading")
+        print("  Install with: pip install python-dotenv")
+
+logger = logging.getLogger("wonderful.tests")
 
 # Auto-detect if running outside Docker and adjust POSTGRES_HOST
 if not os.getenv('POSTGRES_HOST') or os.getenv('POSTGRES_HOST') == 'db':
@@ -42,64 +43,201 @@ if not os.getenv('POSTGRES_HOST') or os.getenv('POSTGRES_HOST') == 'db':
 
 
 @pytest.fixture(scope="session")
-def db_connection():
-    """Create a shared database connection for all tests."""
-    conn = None
+def db_pool():
+    """
+    Open the application's connection pool once for the whole session.
+
+    The tools and the db_conn fixture share this pool, so connections are set up once per
+    session (per worker under pytest-xdist) instead of per test.
+    """
     try:
-        from app.db import get_conn
-        conn = get_conn()
+        from app.db import close_pool, get_conn, get_pool
+        pool = get_pool()
         # Test a simple query to ensure DB is working
-        cur = conn.cursor()
-        cur.execute("SELECT 1")
-        cur.fetchone()
-        cur.close()
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+            cur.fetchone()
         print("\n✓ Database connection successful")
-        yield conn
-        if conn:
-            conn.close()
-            print("✓ Database connection closed")
+        yield pool
+        close_pool()
+        print("✓ Database connection pool closed")
     except ImportError as e:
-        print(f"\n❌ Missing dependency:")
-        print(f"   Error: {e}")
-        print(f"   Install dependencies with: pip install -r requirements.txt")
-        print(f"   Or: pip install psycopg2-binary")
+        logger.error(
+            "Missing dependency: %s (install with: pip install -r requirements.txt). "
+            "Database connection not available; tests may fail.", e,
+        )
         # Don't skip - let tests fail with proper error
         yield None
     except Exception as e:
-        print(f"\n❌ Database connection failed:")
-        print(f"   Error: {e}")
-        print(f"   Traceback:")
-        traceback.print_exc()
-        print(f"\n   Make sure:")
-        print(f"   - Database is running")
-        print(f"   - Conda environment 'wonderful' is activated")
-        print(f"   - Environment variables are set correctly (from .env or environment):")
-        print(f"     POSTGRES_HOST={os.getenv('POSTGRES_HOST', 'db')}")
-        print(f"     POSTGRES_PORT={os.getenv('POSTGRES_PORT', '5432')}")
-        print(f"     POSTGRES_DB={os.getenv('POSTGRES_DB', 'pharmacy')}")
-        print(f"     POSTGRES_USER={os.getenv('POSTGRES_USER', 'pharmacy_user')}")
-        pwd = os.getenv('POSTGRES_PASSWORD', 'pharmacy_pass')
-        print(f"     POSTGRES_PASSWORD={'*' * len(pwd) if pwd else '(not set)'}")
-        print(f"   - If using Docker, POSTGRES_HOST should be 'localhost' or '127.0.0.1'")
-        print(f"   - If using Docker Compose, check DB_PORT environment variable")
+        logger.error(
+            "Database connection failed: %s (POSTGRES_HOST=%s POSTGRES_PORT=%s POSTGRES_DB=%s POSTGRES_USER=%s). "
+            "Make sure the database is running and the environment (.env or exported variables) is set; "
+            "outside Docker POSTGRES_HOST should be 'localhost'. Tests may fail.",
+            e,
+            os.getenv('POSTGRES_HOST', 'db'),
+            os.getenv('POSTGRES_PORT', '5432'),
+            os.getenv('POSTGRES_DB', 'pharmacy'),
+            os.getenv('POSTGRES_USER', 'pharmacy_user'),
+            exc_info=True,
+        )
         # Don't skip - let tests fail with proper error messages
         yield None
 
 
+@pytest.fixture
+def db_conn(db_pool):
+    """Check out a pooled connection for one test; it is rolled back and returned afterwards."""
+    if db_pool is None:
+        pytest.fail("Database connection not available")
+    from app.db import get_conn
+    with get_conn() as conn:
+        yield conn
+
+
 @pytest.fixture(scope="session")
-def db_available(db_connection):
-    """Check if database is available."""
-    return db_connection is not None
+def seed_meds(db_pool):
+    """
+    Seed medications the lookup tests rely on, keyed by brand name (one query per session).
+
+    Skips the dependent tests up front when the seed data isn't loaded, instead of each test
+    probing for it.
+    """
+    from app.db import query_all
+    rows = query_all(
+        "SELECT med_id, brand_name, generic_name, active_ingredients FROM medications WHERE brand_name = ANY(%s)",
+        (["Nurofen", "Acamol"],)
+    )
+    if not rows:
+        pytest.skip("Medication seed data not found - run db/init.sql")
+    return {r["brand_name"]: r for r in rows}
+
+
+@pytest.fixture(scope="session")
+def user_1001(db_pool):
+    """Seed user 1001, looked up once per session; skips the dependent tests when it's missing."""
+    from app.db import query_one
+    row = query_one(
+        "SELECT user_id, full_name, phone, email FROM users WHERE user_id = %s",
+        ("1001",)
+    )
+    if not row:
+        pytest.skip("User seed data not found - run db/init.sql")
+    return row
+
+
+@pytest.fixture
+def rollback_tx(db_pool, monkeypatch):
+    """
+    Run the test's database work in one transaction that is rolled back afterwards.
+
+    app.db.get_conn is patched so every helper called from the test's thread shares a single
+    pooled connection with an open transaction; other threads (e.g. the tool stats flusher) keep
+    using the pool normally. Nothing the test writes is committed, so no cleanup is needed.
+    """
+    from app import db
+
+    original_get_conn = db.get_conn
+    test_thread = threading.current_thread()
+
+    with original_get_conn() as conn:
+        conn.autocommit = False
+
+        @contextmanager
+        def get_conn():
+            if threading.current_thread() is not test_thread:
+                with original_get_conn() as other:
+                    yield other
+                return
+            yield conn
+
+        monkeypatch.setattr(db, "get_conn", get_conn)
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+
+
+@pytest.fixture
+def no_db(monkeypatch):
+    """
+    Fail the test if its thread checks out a database connection.
+
+    For tests of the pure-Python dispatch layer: they run without the database and catch a
+    change that starts querying on those paths. Other threads (e.g. the tool stats flusher)
+    keep using the pool normally.
+    """
+    from app import db
+
+    original_get_conn = db.get_conn
+    test_thread = threading.current_thread()
+
+    @contextmanager
+    def get_conn():
+        if threading.current_thread() is test_thread:
+            pytest.fail("unexpected database access")
+        with original_get_conn() as conn:
+            yield conn
+
+    monkeypatch.setattr(db, "get_conn", get_conn)
+
 
+class _CachedToolCalls:
+    """Session-wide memo of read-only tool results, keyed by function and arguments."""
+
+    def __init__(self):
+        self._results = {}
+
+    def __call__(self, fn, *args, **kwargs):
+        key = (fn.__name__, args, frozenset(kwargs.items()))
+        if key not in self._results:
+            self._results[key] = fn(*args, **kwargs)
+        return self._results[key]
+
+    def invalidate(self, fn):
+        """Drop every cached result of `fn` (call after a test changes the data it reads)."""
+        for key in [k for k in self._results if k[0] == fn.__name__]:
+            del self._results[key]
+
+
+@pytest.fixture(scope="session")
+def cached_call(db_pool):
+    """
+    Call a read-only tool, reusing the result of an identical earlier call in this session.
 
-@pytest.fixture(autouse=True)
-def check_db_before_test(db_connection):
-    """Check database availability before each test."""
-    # Connection is already established in db_connection fixture
-    # If connection is None, tests will fail with proper error messages
-    if db_connection is None:
-        print("\n⚠ Warning: Database connection not available. Tests may fail.")
-    pass
+    Usage: cached_call(list_user_prescriptions, "1003"). Tests that mutate data must call
+    cached_call.invalidate(fn) for the tools whose results they changed.
+    """
+    return _CachedToolCalls()
+
+
+@pytest.fixture(scope="module")
+def rx_pool(cached_call):
+    """
+    Sample prescriptions for the refill tests, looked up once per module.
+
+    "with_refills" is a prescription of user 1003 with refills remaining and "no_refills" any
+    prescription without; either is None when the seed data has no such prescription.
+    """
+    from app.tools import list_user_prescriptions, query_prescriptions_flexible
+    user_rx = cached_call(list_user_prescriptions, "1003")["prescriptions"]
+    no_refills = query_prescriptions_flexible(has_refills=False, limit=1)["prescriptions"]
+    return {
+        "with_refills": next((rx for rx in user_rx if (rx["refills_remaining"] or 0) > 0), None),
+        "no_refills": no_refills[0] if no_refills else None,
+    }
+
+
+@pytest.fixture(scope="class")
+def med001_stock(db_pool):
+    """MED001's stock across all stores, queried once for the stock tests that share it."""
+    from app.tools import query_stock_multiple_stores
+    return query_stock_multiple_stores(med_id="MED001")
+
+
+@pytest.fixture(scope="session")
+def db_available(db_pool):
+    """Check if database is available."""
+    return db_pool is not None
 
 
 @pytest.fixture
@@ -0,0 +1,47 @@
+"""
+Tests for the provider-independent agent stream helpers.
+
+No LLM requests are made; the provider module is only configured on import.
+Run with: pytest tests/test_agents.py -v
+"""
+import os
+import time
+
+# The configured provider's client is created on import; a placeholder key is enough since nothing is sent
+os.environ.setdefault("MODEL_API_KEY", "test-key")
+
+from app.agents import _COALESCE_MAX_DELAY, _coalesce_text_deltas
+
+
+def _text(delta):
+    return {"type": "text_delta", "delta": delta}
+
+
+class TestCoalesceTextDeltas:
+    """Tests for text_delta coalescing."""
+
+    def test_merges_consecutive_deltas(self):
+        """Test back-to-back deltas arrive as one event."""
+        events = list(_coalesce_text_deltas(iter([_text("Hel"), _text("lo")])))
+        assert events == [_text("Hello")]
+
+    def test_flushes_before_other_events(self):
+        """Test buffered text is emitted before a non-text event, preserving order."""
+        tool_call = {"type": "tool_call", "name": "list_stores", "call_id": "c1", "arguments": {}}
+        events = list(_coalesce_text_deltas(iter([_text("a"), tool_call, _text("b")])))
+        assert events == [_text("a"), tool_call, _text("b")]
+
+    def test_delayed_second_delta(self):
+        """Test text buffered before a model pause is delivered without waiting for the next token."""
+        pause = 0.5
+
+        def provider():
+            yield _text("first")
+            time.sleep(pause)
+            yield _text("second")
+
+        start = time.monotonic()
+        arrivals = [(ev, time.monotonic() - start) for ev in _coalesce_text_deltas(provider())]
+        assert [ev for ev, _ in arrivals] == [_text("first"), _text("second")]
+        # Generous margin over the flush delay, still well short of the pause
+        assert arrivals[0][1] < _COALESCE_MAX_DELAY + pause / 2
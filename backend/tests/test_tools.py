@@ -4,20 +4,18 @@ Comprehensive tests for pharmacy tools.
 These tests assume the database is running and contains seed data.
 Run with: pytest backend/tests/test_tools.py -v
 Or from backend directory: pytest tests/test_tools.py -v
+In parallel (pytest-xdist): pytest tests/ -n auto --dist=loadgroup
+Tests that write to the database share an xdist_group so they run on one worker, in order.
 """
 import pytest
-import sys
-import os
 from datetime import datetime, timedelta
 
-# Add parent directory to path for imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-
 from app.tools import (
     get_medication_by_name,
     list_medications,
     search_users,
     check_stock_availability,
+    get_prescription,
     list_user_prescriptions,
     query_medications_flexible,
     query_medications_with_stock,
@@ -25,84 +23,42 @@ from app.tools import (
     list_stores,
     query_prescriptions_flexible,
     request_prescription_refill,
+    request_prescription_refills,
     run_tool,
 )
 
+# Status values the tools may report
+_STOCK_STATUSES = frozenset({"in_stock", "out_of_stock"})
+_RX_STATUSES = frozenset({"expired", "active", "no_refills"})
+
 
 class TestGetMedicationByName:
     """Tests for get_medication_by_name tool."""
     
-    def test_find_existing_medication_by_brand_name(self):
-        """Test finding medication by brand name."""
-        try:
-            result = get_medication_by_name("Nurofen")
-            print(f"\nDEBUG: Result for 'Nurofen': {result}")
-            
-            # Check that we got a result (either found or with candidates)
-            assert "found" in result, f"Result missing 'found' key: {result}"
-            
-            if not result["found"]:
-                # If not found, should have candidates or fuzzy matches
-                print(f"DEBUG: Medication not found. Result: {result}")
-                assert "candidates" in result or "fuzzy" in result, f"Not found but no candidates: {result}"
-                pytest.skip("Medication not found - database may not have seed data")
-            
-            assert result["found"] is True, f"Expected found=True, got {result['found']}"
-            assert "med" in result, f"Result missing 'med' key: {result}"
-            assert result["med"]["brand_name"] == "Nurofen", f"Expected brand_name='Nurofen', got '{result['med'].get('brand_name')}'"
-            assert result["med"]["generic_name"] == "Ibuprofen", f"Expected generic_name='Ibuprofen', got '{result['med'].get('generic_name')}'"
-            # active_ingredients is a list, check if Ibuprofen is in the list
-            active_ingredients = result["med"]["active_ingredients"]
-            assert isinstance(active_ingredients, list), f"active_ingredients should be list, got {type(active_ingredients)}: {active_ingredients}"
-            assert any("Ibuprofen" in ing for ing in active_ingredients), f"Ibuprofen not found in {active_ingredients}"
-        except Exception as e:
-            print(f"\n❌ Test failed with exception:")
-            import traceback
-            traceback.print_exc()
-            raise
-    
-    def test_find_existing_medication_by_generic_name(self):
-        """Test finding medication by generic name."""
-        try:
-            result = get_medication_by_name("Ibuprofen")
-            print(f"\nDEBUG: Result for 'Ibuprofen': {result}")
-            assert "found" in result, f"Result missing 'found' key: {result}"
-            
-            if not result["found"]:
-                print(f"DEBUG: Medication not found. Result: {result}")
-                assert "candidates" in result or "fuzzy" in result
-                pytest.skip("Medication not found - database may not have seed data")
-            
-            assert result["found"] is True, f"Expected found=True, got {result.get('found')}"
-            assert result["med"]["generic_name"] == "Ibuprofen", f"Expected generic_name='Ibuprofen', got '{result['med'].get('generic_name')}'"
-        except Exception as e:
-            print(f"\n❌ Test failed with exception:")
-            import traceback
-            traceback.print_exc()
-            raise
-    
-    def test_find_existing_medication_by_active_ingredient(self):
-        """Test finding medication by active ingredient."""
-        try:
-            result = get_medication_by_name("Paracetamol")
-            print(f"\nDEBUG: Result for 'Paracetamol': {result}")
-            assert "found" in result, f"Result missing 'found' key: {result}"
-            
-            if not result["found"]:
-                print(f"DEBUG: Medication not found. Result: {result}")
-                assert "candidates" in result or "fuzzy" in result
-                pytest.skip("Medication not found - database may not have seed data")
-            
-            assert result["found"] is True, f"Expected found=True, got {result.get('found')}"
+    @pytest.mark.parametrize("query,seed_brand,unique,field,expected", [
+        ("Nurofen", "Nurofen", True, "brand_name", "Nurofen"),
+        ("Ibuprofen", "Nurofen", False, "generic_name", "Ibuprofen"),
+        ("Paracetamol", "Acamol", False, "active_ingredients", "Paracetamol"),
+    ])
+    def test_find_existing_medication(self, seed_meds, query, seed_brand, unique, field, expected):
+        """Test finding medication by brand name, generic name, or active ingredient."""
+        result = get_medication_by_name(query)
+        
+        if not unique and not result["found"]:
+            # Seed data is present, so a miss means several products share the name
+            candidate_ids = [c["med_id"] for c in result["candidates"]]
+            assert seed_meds[seed_brand]["med_id"] in candidate_ids, f"Seed medication not among candidates: {result}"
+            return
+        
+        assert result["found"] is True, f"Expected found=True, got {result}"
+        med = result["med"]
+        assert med["med_id"] == seed_meds[seed_brand]["med_id"]
+        if field == "active_ingredients":
             # active_ingredients is a list
-            active_ingredients = result["med"]["active_ingredients"]
-            assert isinstance(active_ingredients, list), f"active_ingredients should be list, got {type(active_ingredients)}: {active_ingredients}"
-            assert any("Paracetamol" in ing for ing in active_ingredients), f"Paracetamol not found in {active_ingredients}"
-        except Exception as e:
-            print(f"\n❌ Test failed with exception:")
-            import traceback
-            traceback.print_exc()
-            raise
+            assert isinstance(med[field], list), f"active_ingredients should be list, got {type(med[field])}: {med[field]}"
+            assert any(expected in ing for ing in med[field]), f"{expected} not found in {med[field]}"
+        else:
+            assert med[field] == expected, f"Expected {field}={expected!r}, got {med[field]!r}"
     
     def test_medication_not_found(self):
         """Test handling of non-existent medication."""
@@ -118,6 +74,12 @@ class TestGetMedicationByName:
         if not result["found"]:
             assert "fuzzy" in result or "candidates" in result
     
+    def test_cached_result_not_shared(self):
+        """Test mutating a returned result doesn't change what later calls return."""
+        first = get_medication_by_name("Nurofen")
+        first.clear()
+        assert "found" in get_medication_by_name("Nurofen")
+    
     def test_ambiguous_results(self):
         """Test handling of ambiguous medication names."""
         # This depends on your seed data - adjust if needed
@@ -144,49 +106,64 @@ class TestListMedications:
         assert result["count"] > 0
         # All results should contain the search term in some field
         for med in result["medications"]:
-            assert (
-                "ibuprofen" in med["brand_name"].lower() or
-                "ibuprofen" in med["generic_name"].lower() or
-                "ibuprofen" in med["active_ingredients"].lower()
-            )
+            haystack = " ".join((med["brand_name"], med["generic_name"], med["active_ingredients"])).lower()
+            assert "ibuprofen" in haystack, f"{med['med_id']} does not mention ibuprofen"
     
     def test_limit_parameter(self):
         """Test limit parameter works."""
         result = list_medications(limit=2)
         assert result["count"] <= 2
     
+    def test_zero_limit(self):
+        """Test limit=0 returns an empty page."""
+        result = list_medications(limit=0)
+        assert result == {"count": 0, "medications": [], "next_cursor": None}
+    
     def test_empty_search_results(self):
         """Test search with term that doesn't match."""
         result = list_medications(search_term="XYZ123NonExistent", limit=10)
         assert "medications" in result
         assert result["count"] == 0
 
+    def test_cursor_pagination(self):
+        """Test paging with next_cursor returns the following rows without overlap."""
+        first = list_medications(limit=3)
+        assert first["count"] == 3
+        assert first["next_cursor"]
+        second = list_medications(limit=3, cursor=first["next_cursor"])
+        first_ids = {m["med_id"] for m in first["medications"]}
+        second_ids = {m["med_id"] for m in second["medications"]}
+        assert second["count"] > 0
+        assert not first_ids & second_ids
+        # Together the two pages match a single larger page
+        combined = list_medications(limit=6)
+        assert [m["med_id"] for m in combined["medications"]] == (
+            [m["med_id"] for m in first["medications"]] + [m["med_id"] for m in second["medications"]]
+        )
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected."""
+        result = list_medications(cursor="not-a-cursor")
+        assert result["error"] == "INVALID_CURSOR"
+
 
 class TestSearchUsers:
     """Tests for search_users tool."""
     
-    def test_search_by_user_id(self):
-        """Test searching user by ID."""
-        result = search_users(user_id="1001")
-        assert result["count"] > 0
-        assert result["users"][0]["user_id"] == "1001"
-    
-    def test_search_by_name(self):
-        """Test searching user by name."""
-        result = search_users(name="User 1001")
-        assert result["count"] > 0
-        assert "1001" in result["users"][0]["user_id"]
-    
-    def test_search_by_email(self):
-        """Test searching user by email."""
-        result = search_users(email="user1001@example.com")
-        assert result["count"] > 0
-        assert "user1001@example.com" in result["users"][0]["email"]
-    
-    def test_search_by_phone(self):
-        """Test searching user by phone."""
-        result = search_users(phone="+972-50-00001001")
+    @pytest.mark.parametrize(
+        "field, column",
+        [
+            ("user_id", "user_id"),
+            ("name", "full_name"),
+            ("email", "email"),
+            ("phone", "phone"),
+        ],
+    )
+    def test_search_by_field(self, user_1001, field, column):
+        """Test searching user 1001 by each selector."""
+        result = search_users(**{field: user_1001[column]})
         assert result["count"] > 0
+        assert result["users"][0]["user_id"] == user_1001["user_id"]
     
     def test_no_search_parameters_error(self):
         """Test error when no search parameters provided."""
@@ -205,7 +182,7 @@ class TestCheckStockAvailability:
         assert "store_id" in result
         assert "quantity" in result
         assert "status" in result
-        assert result["status"] in ["in_stock", "out_of_stock"]
+        assert result["status"] in _STOCK_STATUSES
     
     def test_check_stock_not_found(self):
         """Test checking stock for non-existent entry."""
@@ -217,21 +194,39 @@ class TestCheckStockAvailability:
 class TestListUserPrescriptions:
     """Tests for list_user_prescriptions tool."""
     
-    def test_list_prescriptions_existing_user(self):
+    def test_list_prescriptions_existing_user(self, cached_call):
         """Test listing prescriptions for user with prescriptions."""
-        result = list_user_prescriptions("1003")
+        result = cached_call(list_user_prescriptions, "1003")
         assert "prescriptions" in result
         assert "user_id" in result
         assert result["user_id"] == "1003"
         assert isinstance(result["prescriptions"], list)
     
-    def test_list_prescriptions_user_without_prescriptions(self):
+    def test_list_prescriptions_user_without_prescriptions(self, cached_call):
         """Test listing prescriptions for user without prescriptions."""
-        result = list_user_prescriptions("1001")
+        result = cached_call(list_user_prescriptions, "1001")
         assert "prescriptions" in result
         assert result["prescriptions"] == []
 
 
+class TestGetPrescription:
+    """Tests for get_prescription lookup."""
+    
+    def test_get_existing_prescription(self, cached_call):
+        """Test fetching a prescription by id."""
+        rx_list = cached_call(list_user_prescriptions, "1003")
+        if not rx_list["prescriptions"]:
+            pytest.skip("No prescriptions found for user 1003")
+        rx = rx_list["prescriptions"][0]
+        result = get_prescription(rx["prescription_id"])
+        assert result["user_id"] == "1003"
+        assert {k: result[k] for k in rx} == rx
+    
+    def test_get_prescription_not_found(self):
+        """Test fetching a non-existent prescription."""
+        assert get_prescription("RX-9999") is None
+
+
 class TestQueryMedicationsFlexible:
     """Tests for query_medications_flexible tool."""
     
@@ -282,9 +277,7 @@ class TestQueryMedicationsWithStock:
         assert "medications" in result
         assert result["count"] > 0
         # Check that stock info is included
-        for med in result["medications"]:
-            assert "stock" in med
-            assert isinstance(med["stock"], list)
+        assert all(isinstance(med.get("stock"), list) for med in result["medications"])
     
     def test_query_in_stock_only(self):
         """Test filtering to only in-stock medications."""
@@ -295,9 +288,18 @@ class TestQueryMedicationsWithStock:
         )
         assert "medications" in result
         # All returned medications should have stock
+        assert all(
+            any(s["status"] == "in_stock" for s in med["stock"])
+            for med in result["medications"] if med["stock"]
+        )
+    
+    def test_query_in_stock_only_any_store(self):
+        """Test in_stock_only without store_ids filters on stock at any store."""
+        result = query_medications_with_stock(in_stock_only=True, limit=10)
+        assert "medications" in result
         for med in result["medications"]:
-            if med["stock"]:
-                assert any(s["status"] == "in_stock" for s in med["stock"])
+            assert med["stock"], f"{med['med_id']} returned without any stock"
+            assert all(s["status"] == "in_stock" for s in med["stock"])
     
     def test_query_multiple_stores(self):
         """Test querying across multiple stores."""
@@ -308,19 +310,16 @@ class TestQueryMedicationsWithStock:
         assert "medications" in result
         # Check stock info includes multiple stores
         for med in result["medications"]:
-            store_ids = [s["store_id"] for s in med["stock"]]
-            assert len(set(store_ids)) <= 2  # Should have at most 2 stores
+            assert len({s["store_id"] for s in med["stock"]}) <= 2  # Should have at most 2 stores
 
 
 class TestQueryStockMultipleStores:
     """Tests for query_stock_multiple_stores tool."""
     
-    def test_query_by_med_id(self):
+    def test_query_by_med_id(self, med001_stock):
         """Test querying stock by medication ID."""
-        result = query_stock_multiple_stores(med_id="MED001")
-        assert "med_id" in result
-        assert "stock" in result
-        assert isinstance(result["stock"], list)
+        assert med001_stock["med_id"] == "MED001"
+        assert isinstance(med001_stock["stock"], list)
     
     def test_query_by_med_name(self):
         """Test querying stock by medication name."""
@@ -328,25 +327,23 @@ class TestQueryStockMultipleStores:
         assert "med_id" in result
         assert "stock" in result
     
-    def test_query_specific_stores(self):
+    def test_query_specific_stores(self, med001_stock):
         """Test querying stock for specific stores."""
         result = query_stock_multiple_stores(
             med_id="MED001",
             store_ids=["STORE_TLV_01"]
         )
-        assert "stock" in result
-        for stock_item in result["stock"]:
-            assert stock_item["store_id"] == "STORE_TLV_01"
+        # Exactly the unfiltered rows for that store
+        assert result["stock"] == [s for s in med001_stock["stock"] if s["store_id"] == "STORE_TLV_01"]
     
-    def test_query_in_stock_only(self):
+    def test_query_in_stock_only(self, med001_stock):
         """Test filtering to only in-stock stores."""
         result = query_stock_multiple_stores(
             med_id="MED001",
             in_stock_only=True
         )
-        assert "stock" in result
-        for stock_item in result["stock"]:
-            assert stock_item["status"] == "in_stock"
+        # Exactly the unfiltered rows that have stock
+        assert result["stock"] == [s for s in med001_stock["stock"] if s["status"] == "in_stock"]
     
     def test_medication_not_found(self):
         """Test handling of non-existent medication."""
@@ -413,7 +410,7 @@ class TestQueryPrescriptionsFlexible:
         assert "prescriptions" in result
         for rx in result["prescriptions"]:
             assert "status" in rx
-            assert rx["status"] in ["expired", "active", "no_refills"]
+            assert rx["status"] in _RX_STATUSES
     
     def test_query_has_refills(self):
         """Test filtering by refill availability."""
@@ -429,46 +426,43 @@ class TestQueryPrescriptionsFlexible:
         for rx in result["prescriptions"]:
             assert rx["refills_remaining"] <= 0
     
+    def test_zero_limit(self):
+        """Test limit=0 returns an empty page."""
+        result = query_prescriptions_flexible(limit=0)
+        assert result == {"count": 0, "prescriptions": [], "next_cursor": None}
+    
     def test_medication_not_found(self):
         """Test handling of non-existent medication name."""
         result = query_prescriptions_flexible(med_name="NonExistentMed")
         assert "error" in result
         assert result["error"] == "MEDICATION_NOT_FOUND"
 
+    def test_cursor_pagination(self):
+        """Test paging through prescriptions with next_cursor."""
+        first = query_prescriptions_flexible(limit=5)
+        assert first["count"] == 5
+        assert first["next_cursor"]
+        second = query_prescriptions_flexible(limit=5, cursor=first["next_cursor"])
+        first_ids = {rx["prescription_id"] for rx in first["prescriptions"]}
+        second_ids = {rx["prescription_id"] for rx in second["prescriptions"]}
+        assert second["count"] > 0
+        assert not first_ids & second_ids
+
 
 class TestRequestPrescriptionRefill:
     """Tests for request_prescription_refill tool."""
     
-    def test_refill_valid_prescription(self):
+    @pytest.mark.xdist_group("db_mutation")
+    def test_refill_valid_prescription(self, rx_pool, rollback_tx):
         """Test refilling a valid prescription."""
-        # First, get a prescription that has refills
-        rx_list = list_user_prescriptions("1003")
-        if not rx_list["prescriptions"]:
-            pytest.skip("No prescriptions found for user 1003")
-        
-        # Find a prescription with refills remaining
-        rx_with_refills = None
-        for rx in rx_list["prescriptions"]:
-            if rx["refills_remaining"] > 0:
-                rx_with_refills = rx
-                break
-        
+        rx_with_refills = rx_pool["with_refills"]
         if not rx_with_refills:
             pytest.skip("No prescriptions with refills remaining for user 1003")
         
         # Get original refills count
         original_refills = rx_with_refills["refills_remaining"]
         
-        # Clean up any existing refill requests for this prescription to avoid unique constraint violation
-        from app.db import exec_sql
-        try:
-            exec_sql(
-                "DELETE FROM refill_requests WHERE prescription_id = %s",
-                (rx_with_refills["prescription_id"],)
-            )
-        except Exception:
-            pass  # Ignore errors in cleanup
-        
+        # rollback_tx undoes the refill (and its refill_requests row) after the test
         result = request_prescription_refill("1003", rx_with_refills["prescription_id"])
         
         # Should succeed
@@ -477,14 +471,10 @@ class TestRequestPrescriptionRefill:
         assert result["status"] == "submitted"
         
         # Verify refills decreased
-        rx_after = list_user_prescriptions("1003")
-        rx_updated = next(
-            (r for r in rx_after["prescriptions"] if r["prescription_id"] == rx_with_refills["prescription_id"]),
-            None
-        )
-        if rx_updated:
-            assert rx_updated["refills_remaining"] == original_refills - 1, \
-                f"Expected refills to decrease from {original_refills} to {original_refills - 1}, got {rx_updated['refills_remaining']}"
+        rx_updated = get_prescription(rx_with_refills["prescription_id"])
+        assert rx_updated is not None
+        assert rx_updated["refills_remaining"] == original_refills - 1, \
+            f"Expected refills to decrease from {original_refills} to {original_refills - 1}, got {rx_updated['refills_remaining']}"
     
     def test_refill_not_found(self):
         """Test refilling non-existent prescription."""
@@ -492,24 +482,61 @@ class TestRequestPrescriptionRefill:
         assert result["accepted"] is False
         assert result["error"] == "NOT_FOUND"
     
-    def test_refill_unauthorized(self):
+    def test_refill_unauthorized(self, cached_call):
         """Test refilling prescription for wrong user."""
-        rx_list = list_user_prescriptions("1003")
+        rx_list = cached_call(list_user_prescriptions, "1003")
         if rx_list["prescriptions"]:
             rx = rx_list["prescriptions"][0]
             result = request_prescription_refill("1001", rx["prescription_id"])
             assert result["accepted"] is False
             assert result["error"] == "UNAUTHORIZED"
     
-    def test_refill_no_refills_remaining(self):
+    def test_refill_no_refills_remaining(self, rx_pool):
         """Test refilling prescription with no refills."""
-        # Find a prescription with no refills
+        rx = rx_pool["no_refills"]
+        if not rx:
+            pytest.skip("No prescriptions without refills in seed data")
+        result = request_prescription_refill(rx["user_id"], rx["prescription_id"])
+        assert result["accepted"] is False
+        assert result["error"] == "NO_REFILLS"
+
+
+class TestRequestPrescriptionRefills:
+    """Tests for request_prescription_refills batch tool."""
+    
+    def test_refills_not_found(self):
+        """Test batch refill of non-existent prescriptions."""
+        result = request_prescription_refills("1001", ["RX-9998", "RX-9999"])
+        assert result["count"] == 2
+        assert result["accepted_count"] == 0
+        assert [r["prescription_id"] for r in result["results"]] == ["RX-9998", "RX-9999"]
+        assert all(r["error"] == "NOT_FOUND" for r in result["results"])
+    
+    def test_refills_unauthorized(self, cached_call):
+        """Test batch refill of another user's prescriptions."""
+        rx_list = cached_call(list_user_prescriptions, "1003")
+        if not rx_list["prescriptions"]:
+            pytest.skip("No prescriptions found for user 1003")
+        
+        ids = [rx["prescription_id"] for rx in rx_list["prescriptions"]]
+        result = request_prescription_refills("1001", ids)
+        assert result["accepted_count"] == 0
+        assert [r["prescription_id"] for r in result["results"]] == ids
+        assert all(r["error"] == "UNAUTHORIZED" for r in result["results"])
+    
+    def test_refills_mixed_and_duplicates(self):
+        """Test batch with an unknown id and a repeated id; results follow input order."""
         rx_list = query_prescriptions_flexible(has_refills=False, limit=1)
-        if rx_list["prescriptions"]:
-            rx = rx_list["prescriptions"][0]
-            result = request_prescription_refill(rx["user_id"], rx["prescription_id"])
-            assert result["accepted"] is False
-            assert result["error"] == "NO_REFILLS"
+        if not rx_list["prescriptions"]:
+            pytest.skip("No prescriptions without refills")
+        
+        rx = rx_list["prescriptions"][0]
+        result = request_prescription_refills(
+            rx["user_id"], [rx["prescription_id"], "RX-9999", rx["prescription_id"]]
+        )
+        assert result["count"] == 2
+        assert result["results"][0]["error"] == "NO_REFILLS"
+        assert result["results"][1]["error"] == "NOT_FOUND"
 
 
 class TestRunTool:
@@ -520,13 +547,13 @@ class TestRunTool:
         result = run_tool("get_medication_by_name", {"name": "Nurofen"})
         assert "found" in result
     
-    def test_run_nonexistent_tool(self):
+    def test_run_nonexistent_tool(self, no_db):
         """Test running a non-existent tool."""
         result = run_tool("non_existent_tool", {})
         assert "error" in result
         assert result["error"] == "UNKNOWN_TOOL"
     
-    def test_run_tool_with_invalid_args(self):
+    def test_run_tool_with_invalid_args(self, no_db):
         """Test running tool with invalid arguments."""
         # This should handle gracefully and return an error
         result = run_tool("get_medication_by_name", {})
@@ -534,34 +561,44 @@ class TestRunTool:
         assert result is not None
         assert "error" in result
         assert result["error"] == "MISSING_REQUIRED_ARGUMENT"
+    
+    def test_run_tool_with_unexpected_args(self, no_db):
+        """Test an argument the tool doesn't declare is reported, not silently ignored."""
+        result = run_tool("query_stock_multiple_stores", {"medication_id": "MED001"})
+        assert result["error"] == "UNEXPECTED_ARGUMENT"
+        assert result["unexpected"] == ["medication_id"]
+    
+    def test_run_tool_caches_catalog_results(self):
+        """Test that repeated read-only catalog calls are served from the result cache."""
+        args = {"search_term": "ibuprofen", "limit": 5}
+        first = run_tool("list_medications", args)
+        second = run_tool("list_medications", dict(args))
+        assert second == first
+        # Each caller gets its own copy, so mutating one result doesn't leak into later hits
+        first["medications"].clear()
+        assert run_tool("list_medications", dict(args)) == second
 
 
 class TestEdgeCases:
     """Tests for edge cases and error handling."""
     
-    def test_empty_string_search(self):
-        """Test handling of empty string searches."""
-        result = list_medications(search_term="", limit=10)
-        assert "medications" in result
+    @pytest.mark.parametrize("tool, args, kwargs, key", [
+        (list_medications, (), {"search_term": "", "limit": 10}, "medications"),
+        (get_medication_by_name, ("Test@#$%",), {}, "found"),
+        (query_medications_flexible, (), {"brand_name": None, "generic_name": None, "limit": 10}, "medications"),
+    ], ids=["empty_string_search", "special_characters_in_search", "none_values"])
+    def test_unusual_input_handled(self, tool, args, kwargs, key):
+        """Test empty strings, special characters and None values return a normal result."""
+        result = tool(*args, **kwargs)
+        assert key in result
     
     def test_very_large_limit(self):
-        """Test handling of very large limit."""
+        """Test handling of very large limit (served through the streaming cursor path)."""
         result = list_medications(limit=10000)
         assert "medications" in result
-    
-    def test_special_characters_in_search(self):
-        """Test handling of special characters in search."""
-        result = get_medication_by_name("Test@#$%")
-        assert "found" in result
-    
-    def test_none_values_handling(self):
-        """Test that None values are handled properly."""
-        result = query_medications_flexible(
-            brand_name=None,
-            generic_name=None,
-            limit=10
-        )
-        assert "medications" in result
+        # The catalog is far smaller than the limit: one complete page, nothing left to page through
+        assert result["count"] == len(result["medications"]) < 10000
+        assert result["next_cursor"] is None
 
 
 if __name__ == "__main__":
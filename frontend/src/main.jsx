@@ -58,6 +58,82 @@ function Sidebar({ isExpanded, onToggle }) {
   );
 }
 
+// Chat transport: WebSocket by default (one JSON frame per event), SSE as fallback.
+// Both call onEvent(ev) for every event; onEvent returns true to stop early.
+function streamViaWebSocket(payload, onEvent) {
+  return new Promise((resolve, reject) => {
+    if (typeof WebSocket === 'undefined') {
+      reject(Object.assign(new Error('WebSocket not supported'), { wsUnavailable: true }));
+      return;
+    }
+    const proto = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const ws = new WebSocket(`${proto}//${window.location.host}/api/chat/ws`);
+    let opened = false;
+
+    ws.onopen = () => {
+      opened = true;
+      ws.send(JSON.stringify(payload));
+    };
+    ws.onmessage = (msg) => {
+      if (onEvent(JSON.parse(msg.data))) {
+        ws.close();
+      }
+    };
+    ws.onerror = () => {
+      if (!opened) {
+        reject(Object.assign(new Error('WebSocket connection failed'), { wsUnavailable: true }));
+      }
+    };
+    ws.onclose = () => {
+      if (opened) {
+        resolve();
+      } else {
+        reject(Object.assign(new Error('WebSocket connection closed'), { wsUnavailable: true }));
+      }
+    };
+  });
+}
+
+async function streamViaSSE(payload, onEvent) {
+  const res = await fetch('/api/chat/stream', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(payload),
+  });
+
+  if (!res.ok || !res.body) {
+    throw new Error(`Request failed with status ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder('utf-8');
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    const parts = buffer.split('\n\n');
+    buffer = parts.pop();
+
+    for (const part of parts) {
+      const line = part.split('\n').find((l) => l.startsWith('data: '));
+      if (!line) continue;
+      if (onEvent(JSON.parse(line.slice(6)))) {
+        try {
+          if (reader.cancel) {
+            await reader.cancel();
+          }
+        } catch (_) {
+          // ignore cancel errors
+        }
+        return;
+      }
+    }
+  }
+}
+
 // Chat Page Component
 function ChatPage() {
   const [messages, setMessages] = useState([]);
@@ -208,71 +284,37 @@ function ChatPage() {
     toolsElRef.current.innerHTML = '';
 
     try {
-      const res = await fetch('/api/chat/stream', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ messages: newMessages }),
-      });
-
-      if (!res.ok || !res.body) {
-        throw new Error(`Request failed with status ${res.status}`);
-      }
-
-      const reader = res.body.getReader();
-      const decoder = new TextDecoder('utf-8');
-      let buffer = '';
-      let errorOccurred = false;
       let assistantContent = '';
 
-      while (true) {
-        const { value, done } = await reader.read();
-        if (done) {
-          // Stream ended - ensure processing state is reset
+      // Returns true when the stream should stop (error event)
+      const handleEvent = (ev) => {
+        if (ev.type === 'text_delta') {
+          assistantContent += ev.delta;
+          appendToLastAssistant(ev.delta);
+        } else if (ev.type === 'tool_call' || ev.type === 'tool_result') {
+          logTool(ev, true);
+        } else if (typeof ev.type === 'string' && ev.type.startsWith('tool_') && ev.type !== 'tool_args_delta') {
+          logTool(ev, false);
+        } else if (ev.type === 'error') {
+          logTool(ev, true);
+          appendToLastAssistant('\n\n[Error: something went wrong processing your request.]');
+          clearTypingIndicator();
           setIsProcessing(false);
-          break;
-        }
-        buffer += decoder.decode(value, { stream: true });
-
-        const parts = buffer.split('\n\n');
-        buffer = parts.pop();
-
-        for (const part of parts) {
-          const line = part.split('\n').find((l) => l.startsWith('data: '));
-          if (!line) continue;
-          const jsonStr = line.slice(6);
-          const ev = JSON.parse(jsonStr);
-
-          if (ev.type === 'text_delta') {
-            assistantContent += ev.delta;
-            appendToLastAssistant(ev.delta);
-          } else if (ev.type === 'tool_call' || ev.type === 'tool_result') {
-            logTool(ev, true);
-          } else if (typeof ev.type === 'string' && ev.type.startsWith('tool_') && ev.type !== 'tool_args_delta') {
-            logTool(ev, false);
-          } else if (ev.type === 'error') {
-            logTool(ev, true);
-            appendToLastAssistant('\n\n[Error: something went wrong processing your request.]');
-            clearTypingIndicator();
-            errorOccurred = true;
-            setIsProcessing(false);
-            break;
-          } else if (ev.type === 'done') {
-            clearTypingIndicator();
-            setIsProcessing(false);
-          }
-        }
-
-        if (errorOccurred) {
-          try {
-            if (reader.cancel) {
-              await reader.cancel();
-            }
-          } catch (_) {
-            // ignore cancel errors
-          }
+          return true;
+        } else if (ev.type === 'done') {
+          clearTypingIndicator();
           setIsProcessing(false);
-          break;
         }
+        return false;
+      };
+
+      const payload = { messages: newMessages };
+      try {
+        await streamViaWebSocket(payload, handleEvent);
+      } catch (err) {
+        // Fall back to SSE only if the socket never opened (e.g. a proxy without upgrade support)
+        if (!err || !err.wsUnavailable) throw err;
+        await streamViaSSE(payload, handleEvent);
       }
 
       setMessages((prev) => {